@@ -0,0 +1,194 @@
+"""
+ALMACÉN DE RESULTADOS DE AUDITORÍA
+Persiste los resultados de cada auditoría en la sesión de Streamlit y en disco,
+indexados por la configuración (rubros, empresa y fecha).
+
+En disco sólo se guarda el resultado base (datos auditados, resumen y
+configuración), una vez por auditoría. Los artefactos derivados (muestras,
+exportaciones, informes) son propios de cada sesión y sólo viven en ella.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+
+# Los archivos de la caché se cargan con pickle/joblib: el directorio es propio
+# de la aplicación (no el temporal del sistema, que es compartido) y sólo
+# accesible por el usuario que la ejecuta
+DIRECTORIO_CACHE = os.path.abspath(os.environ.get(
+    "AUDITORIA_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache_auditoria")
+))
+
+CLAVES_PERSISTIDAS = ('data_dict', 'resumen_df', 'configuracion')
+MAX_RESULTADOS_SESION = 3
+MAX_RESULTADOS_DISCO = 20
+EDAD_MAXIMA_DIAS = 7
+DIRECTORIO_EXPORTACIONES = os.path.join(DIRECTORIO_CACHE, 'exportaciones')
+MAX_EXPORTACIONES_DISCO = 10
+
+
+def preparar_directorio_cache(directorio=DIRECTORIO_CACHE):
+    """
+    Crea el directorio de la caché con permisos 0o700.
+
+    Si no se puede crear, la caché de disco simplemente no se usa. Si ya existe
+    y pertenece a otro usuario se rechaza: sus archivos podrían ejecutar código
+    al deserializarse.
+    """
+    try:
+        os.makedirs(directorio, mode=0o700, exist_ok=True)
+    except OSError:
+        return
+    estado = os.stat(directorio)
+    if hasattr(os, 'getuid') and estado.st_uid != os.getuid():
+        raise PermissionError(f"El directorio de caché {directorio} pertenece a otro usuario")
+    if estado.st_mode & 0o077:
+        os.chmod(directorio, 0o700)
+
+
+def escribir_atomico(directorio, ruta, escribir):
+    """
+    Escribe `ruta` mediante un archivo temporal y os.replace, para no dejar
+    archivos truncados. `escribir` recibe el archivo abierto en modo binario.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    fd, ruta_tmp = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            escribir(f)
+        os.replace(ruta_tmp, ruta)
+    except BaseException:
+        if os.path.exists(ruta_tmp):
+            os.remove(ruta_tmp)
+        raise
+
+
+def podar_directorio(directorio, patron_inicio, patron_fin, max_archivos=None, edad_maxima_dias=None):
+    """Elimina los archivos más viejos que coinciden con el patrón (por antigüedad y cantidad)"""
+    try:
+        archivos = [os.path.join(directorio, n) for n in os.listdir(directorio)
+                    if n.startswith(patron_inicio) and n.endswith(patron_fin)]
+        archivos.sort(key=os.path.getmtime, reverse=True)
+        limite = time.time() - edad_maxima_dias * 86400 if edad_maxima_dias is not None else None
+        for posicion, ruta in enumerate(archivos):
+            if (max_archivos is not None and posicion >= max_archivos) or \
+                    (limite is not None and os.path.getmtime(ruta) < limite):
+                os.remove(ruta)
+    except OSError:
+        pass
+
+
+def clave_configuracion(rubros, empresa, fecha):
+    """Genera una clave estable a partir de la configuración de la auditoría"""
+    config = {
+        'rubros': sorted(rubros),
+        'empresa': empresa.strip(),
+        'fecha': fecha.isoformat() if hasattr(fecha, 'isoformat') else str(fecha)
+    }
+    contenido = json.dumps(config, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()[:16]
+
+
+def eliminar_archivo(ruta):
+    """Elimina un archivo si existe; los errores de disco se ignoran"""
+    try:
+        if ruta and os.path.exists(ruta):
+            os.remove(ruta)
+    except OSError:
+        pass
+
+
+class AlmacenResultados:
+    """Almacén de resultados en dos niveles: sesión (memoria) y disco"""
+
+    CLAVE_SESION = 'resultados_auditoria'
+
+    def __init__(self, sesion, directorio=DIRECTORIO_CACHE):
+        self.sesion = sesion
+        self.directorio = directorio
+        if self.CLAVE_SESION not in self.sesion:
+            self.sesion[self.CLAVE_SESION] = {}
+
+    @property
+    def _memoria(self):
+        return self.sesion[self.CLAVE_SESION]
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"resultado_{clave}.pkl")
+
+    def _recordar(self, clave, resultado):
+        """Guarda en la sesión, descartando los resultados usados hace más tiempo"""
+        self._memoria.pop(clave, None)
+        self._memoria[clave] = resultado
+        while len(self._memoria) > MAX_RESULTADOS_SESION:
+            self._descartar(self._memoria.pop(next(iter(self._memoria))))
+
+    @staticmethod
+    def _descartar(resultado):
+        """Borra los archivos exportados de un resultado que sale de la sesión"""
+        for ruta in resultado.get('exportaciones', {}).values():
+            eliminar_archivo(ruta)
+
+    def guardar(self, clave, resultado):
+        """Guarda el resultado en la sesión y persiste en disco su parte base"""
+        self._recordar(clave, resultado)
+        base = {k: resultado[k] for k in CLAVES_PERSISTIDAS if k in resultado}
+        try:
+            escribir_atomico(self.directorio, self._ruta(clave),
+                             lambda f: pickle.dump(base, f, protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError:
+            # El disco es un respaldo: si falla, el resultado sigue en la sesión
+            pass
+        podar_directorio(self.directorio, 'resultado_', '.pkl', MAX_RESULTADOS_DISCO, EDAD_MAXIMA_DIAS)
+
+    def guardar_artefacto(self, clave, nombre, valor):
+        """Guarda un artefacto derivado (muestras, informes...) sólo en la sesión"""
+        resultado = self._memoria.get(clave)
+        if resultado is not None:
+            resultado[nombre] = valor
+
+    def obtener(self, clave):
+        """Devuelve el resultado guardado o None si no existe"""
+        if clave in self._memoria:
+            resultado = self._memoria[clave]
+            self._recordar(clave, resultado)
+            return resultado
+
+        ruta = self._ruta(clave)
+        if not os.path.exists(ruta):
+            return None
+        try:
+            with open(ruta, 'rb') as f:
+                resultado = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+        self._recordar(clave, resultado)
+        return resultado
+
+    def resultados_en_disco(self):
+        """Itera (clave, resultado) sobre todos los resultados persistidos"""
+        if not os.path.isdir(self.directorio):
+            return
+        for nombre in sorted(os.listdir(self.directorio)):
+            if nombre.startswith('resultado_') and nombre.endswith('.pkl'):
+                clave = nombre[len('resultado_'):-len('.pkl')]
+                resultado = self.obtener(clave)
+                if resultado is not None:
+                    yield clave, resultado
+
+    def eliminar(self, clave):
+        """Elimina el resultado de la sesión y del disco"""
+        resultado = self._memoria.pop(clave, None)
+        if resultado is not None:
+            self._descartar(resultado)
+        ruta = self._ruta(clave)
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+
+preparar_directorio_cache()
@@ -0,0 +1,107 @@
+"""
+MOTOR DE AMORTIZACIÓN DE GASTOS PAGADOS POR ADELANTADO
+Expande cada prepago en su cronograma mensual y calcula el saldo devengado y
+no devengado a una o varias fechas de corte.
+
+Convención: la primera cuota se devenga en el mes de fecha_pago y cada cuota
+siguiente en el mes calendario posterior. La última cuota absorbe el redondeo.
+Todo el cálculo se hace sobre arrays (np.repeat y broadcasting), sin bucles
+por contrato.
+"""
+
+import numpy as np
+import pandas as pd
+
+TOLERANCIA_CUOTA = 0.01
+
+
+def _meses(fechas):
+    """Convierte fechas en número de mes absoluto (datetime64[M] como entero)"""
+    return pd.to_datetime(fechas).to_numpy('datetime64[M]').astype(np.int64)
+
+
+def _cuota_redondeada(monto_total, duracion):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(duracion > 0, np.round(monto_total / duracion, 2), 0.0)
+
+
+def cronograma_amortizacion(prepagos):
+    """Devuelve el cronograma mensual (una fila por cuota) de todos los prepagos"""
+    duracion = np.maximum(prepagos['duracion_meses'].to_numpy(dtype=np.int64), 0)
+    monto_total = prepagos['monto_total'].to_numpy(dtype=np.float64)
+    mes_pago = _meses(prepagos['fecha_pago'])
+    cuota = _cuota_redondeada(monto_total, duracion)
+
+    fila = np.repeat(np.arange(len(prepagos)), duracion)
+    inicio = np.cumsum(duracion) - duracion
+    numero = np.arange(len(fila)) - inicio[fila]
+    es_ultima = numero == duracion[fila] - 1
+
+    importe = np.where(es_ultima, monto_total[fila] - cuota[fila] * (duracion[fila] - 1), cuota[fila])
+    importe_acumulado = np.where(es_ultima, monto_total[fila], cuota[fila] * (numero + 1))
+
+    return pd.DataFrame({
+        'id_prepago': prepagos['id_prepago'].to_numpy()[fila],
+        'cuota': numero + 1,
+        'periodo': (mes_pago[fila] + numero).astype('datetime64[M]'),
+        'importe': np.round(importe, 2),
+        'devengado_acumulado': np.round(importe_acumulado, 2),
+        'saldo_no_devengado': np.round(monto_total[fila] - importe_acumulado, 2)
+    })
+
+
+def devengamiento_al_corte(prepagos, fechas_corte):
+    """
+    Calcula devengado y no devengado de cada prepago a cada fecha de corte.
+
+    Devuelve un DataFrame largo con una fila por (prepago, fecha de corte),
+    calculado por broadcasting de n contratos x k cortes.
+    """
+    cortes = pd.to_datetime(pd.Index(np.atleast_1d(fechas_corte)))
+    duracion = np.maximum(prepagos['duracion_meses'].to_numpy(dtype=np.int64), 0)
+    monto_total = prepagos['monto_total'].to_numpy(dtype=np.float64)
+    mes_pago = _meses(prepagos['fecha_pago'])
+    cuota = _cuota_redondeada(monto_total, duracion)
+
+    mes_corte = _meses(cortes)
+    transcurridos = mes_corte[None, :] - mes_pago[:, None] + 1
+    meses_devengados = np.clip(transcurridos, 0, duracion[:, None])
+    devengado = np.where(meses_devengados >= duracion[:, None],
+                         monto_total[:, None],
+                         cuota[:, None] * meses_devengados)
+
+    n, k = meses_devengados.shape
+    return pd.DataFrame({
+        'id_prepago': np.repeat(prepagos['id_prepago'].to_numpy(), k),
+        'fecha_corte': np.tile(cortes.to_numpy(), n),
+        'meses_devengados': meses_devengados.ravel(),
+        'monto_devengado': np.round(devengado, 2).ravel(),
+        'saldo_no_devengado': np.round(monto_total[:, None] - devengado, 2).ravel()
+    })
+
+
+def auditar_devengamiento(df, fecha_corte, tolerancia=TOLERANCIA_CUOTA):
+    """Agrega el devengamiento al corte y las inconsistencias detectadas"""
+    corte = devengamiento_al_corte(df, fecha_corte)
+    df = df.copy(deep=False)
+    df['meses_devengados'] = corte['meses_devengados'].to_numpy()
+    df['monto_devengado'] = corte['monto_devengado'].to_numpy()
+    df['saldo_no_devengado'] = corte['saldo_no_devengado'].to_numpy()
+
+    duracion = df['duracion_meses'].to_numpy()
+    monto_total = df['monto_total'].to_numpy(dtype=np.float64)
+    fecha_pago = pd.to_datetime(df['fecha_pago'])
+    diferencia_cuota = np.abs(df['monto_mensual'].to_numpy(dtype=np.float64) * duracion - monto_total)
+
+    df['inconsistencia_devengamiento'] = np.select(
+        [duracion <= 0,
+         fecha_pago > pd.Timestamp(fecha_corte),
+         diferencia_cuota > tolerancia * np.maximum(duracion, 1) + 0.01,
+         (df['saldo_no_devengado'] <= 0) & (monto_total > 0)],
+        ['Duración inválida',
+         'Pago posterior al corte',
+         'Cuota mensual inconsistente',
+         'Totalmente devengado: reclasificar a resultados'],
+        default=None
+    )
+    return df
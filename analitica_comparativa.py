@@ -0,0 +1,185 @@
+"""
+ANALÍTICA COMPARATIVA MULTI-PERÍODO - NIA 520
+Guarda agregados mensuales por rubro (cantidad, importe, anomalías, alertas)
+y calcula sobre ellos variaciones interanuales y mensuales, ratios y
+tendencia, señalando fluctuaciones significativas como procedimiento
+analítico. En Caja y Bancos el importe del período es el flujo neto
+(ingresos menos egresos).
+
+Las comparaciones se calculan siempre a partir de los agregados guardados
+(los anuales se obtienen sumando los mensuales); nunca se vuelven a recorrer
+las transacciones. Cada período guarda la fecha de corte de la auditoría que
+lo registró: los períodos que terminan después del último corte están
+incompletos y no entran en las variaciones ni en la tendencia.
+"""
+
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from almacen_resultados import DIRECTORIO_CACHE, escribir_atomico
+from conciliacion_rubros import TIPOS_EGRESO
+
+# Columna de fecha que ubica cada registro en un período
+COLUMNA_FECHA = {
+    'Caja y Bancos': 'fecha_hora',
+    'Inversiones': 'fecha_inicio',
+    'Cuentas a Cobrar': 'fecha_emision',
+    'Inventarios': 'fecha_ingreso',
+    'Prepagos': 'fecha_pago'
+}
+
+FRECUENCIAS = {'M': 'Mensual', 'Y': 'Anual'}
+UMBRAL_VARIACION = 0.20
+UMBRAL_DESVIO_TENDENCIA = 2.0
+COLUMNAS_AGREGADO = ['cantidad', 'importe', 'anomalias', 'con_alerta']
+
+
+def importe_con_signo(df, columna_importe):
+    """Importe de cada registro; los egresos de Caja y Bancos (Gasto, Pago) restan"""
+    importe = pd.to_numeric(df[columna_importe], errors='coerce').fillna(0)
+    if 'tipo_transaccion' in df.columns:
+        importe = importe.mask(df['tipo_transaccion'].isin(TIPOS_EGRESO), -importe)
+    return importe
+
+
+def agregar_por_periodo(df, columna_fecha, columna_importe, fecha_corte=None):
+    """
+    Agregados mensuales de un rubro (una fila por mes) con la fecha de corte.
+
+    Sin fecha_corte se toma la fecha del último registro.
+    """
+    fechas = pd.to_datetime(df[columna_fecha])
+    periodo = fechas.dt.to_period('M')
+    datos = pd.DataFrame({
+        'periodo': periodo,
+        'cantidad': 1,
+        'importe': importe_con_signo(df, columna_importe),
+        'anomalias': (df['resultado_if'] == 'Anómalo') if 'resultado_if' in df.columns else False,
+        'con_alerta': df['alerta'].notna() if 'alerta' in df.columns else False
+    })
+    agregados = datos.groupby('periodo', sort=True)[COLUMNAS_AGREGADO].sum()
+    agregados = agregados.astype({'cantidad': 'int64', 'anomalias': 'int64', 'con_alerta': 'int64'})
+    agregados['corte'] = pd.Timestamp(fecha_corte if fecha_corte is not None else fechas.max()).normalize()
+    return agregados
+
+
+class AlmacenAgregados:
+    """Agregados por período persistidos en disco, por entidad y rubro"""
+
+    def __init__(self, directorio=DIRECTORIO_CACHE):
+        self.directorio = directorio
+
+    def _ruta(self, entidad, rubro):
+        clave = hashlib.sha1(f"{entidad.strip()}|{rubro}".encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.directorio, f"agregados_{clave}.pkl")
+
+    def obtener(self, entidad, rubro):
+        ruta = self._ruta(entidad, rubro)
+        if not os.path.exists(ruta):
+            return None
+        try:
+            with open(ruta, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def actualizar(self, entidad, rubro, agregados):
+        """Incorpora agregados nuevos; los períodos repetidos se reemplazan"""
+        existentes = self.obtener(entidad, rubro)
+        if existentes is not None:
+            agregados = pd.concat([existentes[~existentes.index.isin(agregados.index)], agregados]).sort_index()
+
+        try:
+            escribir_atomico(self.directorio, self._ruta(entidad, rubro),
+                             lambda f: pickle.dump(agregados, f, protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError:
+            # El historial es un respaldo: si el disco falla, la auditoría sigue
+            pass
+        return agregados
+
+
+def registrar_periodos(almacen, entidad, data_dict, columnas_importe, fecha_corte=None):
+    """Calcula y guarda los agregados por período de todos los rubros auditados"""
+    for rubro, df in data_dict.items():
+        columna_fecha = COLUMNA_FECHA.get(rubro)
+        if columna_fecha in df.columns and columnas_importe.get(rubro) in df.columns:
+            almacen.actualizar(entidad, rubro,
+                               agregar_por_periodo(df, columna_fecha, columnas_importe[rubro], fecha_corte))
+
+
+def periodos_completos(indice, corte):
+    """Máscara de los períodos que terminan en o antes de la fecha de corte"""
+    if corte is None or pd.isna(corte):
+        return np.ones(len(indice), dtype=bool)
+    return np.array(indice.end_time.normalize() <= pd.Timestamp(corte).normalize())
+
+
+def variaciones(agregados, frecuencia='M', umbral=UMBRAL_VARIACION, umbral_tendencia=UMBRAL_DESVIO_TENDENCIA):
+    """
+    Variaciones, ratios y tendencia sobre los agregados por período.
+
+    frecuencia 'M' compara mes contra mes anterior y contra el mismo mes del año
+    previo; 'Y' suma los meses de cada año y compara año contra año.
+    """
+    # Los agregados guardados antes de registrar el corte se consideran completos
+    corte = agregados['corte'].max() if 'corte' in agregados.columns else None
+    serie = agregados[COLUMNAS_AGREGADO]
+    if frecuencia == 'Y':
+        serie = serie.groupby(serie.index.asfreq('Y')).sum()
+
+    # Períodos completos: los meses/años sin movimientos quedan en cero
+    indice = pd.period_range(serie.index.min(), serie.index.max(), freq=serie.index.freq)
+    serie = serie.reindex(indice, fill_value=0)
+    # Los incompletos son siempre los del final; si ninguno está completo no hay con qué
+    # compararlos y se analizan todos
+    completo = periodos_completos(indice, corte)
+    if not completo.any():
+        completo[:] = True
+    incompletos = serie[~completo]
+    serie = serie[completo]
+    resultado = serie.copy()
+
+    importe = serie['importe'].to_numpy(dtype=np.float64)
+    anterior = np.r_[np.nan, importe[:-1]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        resultado['variacion'] = importe - anterior
+        resultado['variacion_pct'] = np.where(anterior != 0, (importe - anterior) / np.abs(anterior), np.nan)
+        if frecuencia == 'M':
+            interanual = np.full(len(importe), np.nan)
+            interanual[12:] = importe[:-12]
+            resultado['variacion_interanual_pct'] = np.where(interanual != 0, (importe - interanual) / np.abs(interanual), np.nan)
+        cantidad = serie['cantidad'].to_numpy(dtype=np.float64)
+        resultado['importe_promedio'] = np.where(cantidad > 0, importe / cantidad, 0.0)
+        resultado['ratio_anomalias'] = np.where(cantidad > 0, serie['anomalias'] / cantidad, 0.0)
+
+    # Tendencia lineal y desvío estandarizado respecto de ella
+    x = np.arange(len(importe), dtype=np.float64)
+    if len(importe) >= 3:
+        pendiente, ordenada = np.polyfit(x, importe, 1)
+        tendencia = pendiente * x + ordenada
+        residuo = importe - tendencia
+        desvio = residuo.std(ddof=1)
+        z = residuo / desvio if desvio > 0 else np.zeros_like(residuo)
+    else:
+        tendencia = importe.copy()
+        z = np.zeros_like(importe)
+    resultado['tendencia'] = np.round(tendencia, 2)
+    resultado['desvio_tendencia_z'] = np.round(z, 2)
+
+    fluctuacion = np.abs(np.nan_to_num(resultado['variacion_pct'].to_numpy())) > umbral
+    fuera_tendencia = np.abs(z) > umbral_tendencia
+    resultado['fluctuacion'] = np.select(
+        [fluctuacion & fuera_tendencia, fuera_tendencia, fluctuacion],
+        ['Variación significativa fuera de tendencia', 'Fuera de tendencia', 'Variación significativa'],
+        default=None
+    )
+    # Los períodos incompletos se muestran sin variaciones ni tendencia
+    resultado['periodo_completo'] = True
+    resultado = pd.concat([resultado, incompletos.assign(periodo_completo=False)])
+    resultado.index = resultado.index.astype(str)
+    resultado.index.name = 'periodo'
+    return resultado
@@ -10,12 +10,29 @@ from faker import Faker
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
 import streamlit as st
 import os
+import io
 import tempfile
 from generador_informe import GeneradorInformeAuditoria
+from componentes_informe import construir_componentes
+from almacen_resultados import (AlmacenResultados, DIRECTORIO_EXPORTACIONES, EDAD_MAXIMA_DIAS,
+                                 MAX_EXPORTACIONES_DISCO, clave_configuracion, eliminar_archivo,
+                                 podar_directorio)
+from cache_persistente import en_cache_disco, explicaciones_guardadas, huella_datos, modelo_ajustado
+from ejecucion_fuera_de_memoria import (PRESUPUESTO_MEMORIA_MB, agregar_resultados_if, excede_presupuesto,
+                                        isolation_forest_por_bloques)
+from explicacion_anomalias import (COLUMNA_FACTOR, agregar_explicaciones, aportes_registro, columnas_aporte,
+                                   contribuciones, explicar)
+from valuacion_inventarios import valuar_inventario
+from amortizacion_prepagos import auditar_devengamiento
+from valuacion_inversiones import valuar_inversiones
+from analitica_comparativa import (AlmacenAgregados, COLUMNA_FECHA, FRECUENCIAS, UMBRAL_VARIACION,
+                                   registrar_periodos, variaciones)
+from conciliacion_rubros import conciliar_rubros, partidas_sin_conciliar
+from consultas_sql import ConsultorSQL, duckdb_disponible
+from visor_hallazgos import pagina_hallazgos, contar_hallazgos, opciones_alerta, TAMANO_PAGINA
+from muestreo_auditoria import seleccionar_muestra, METODOS_MUESTREO, FACTORES_CONFIANZA
 
 # Configuración de la página
 st.set_page_config(
@@ -28,11 +45,22 @@ st.set_page_config(
 # ===============================================================
 # FUNCIONES DE GENERACIÓN DE DATOS POR RUBRO
 # ===============================================================
+# Los generadores y modelos se comparten entre sesiones (st.cache_resource) y
+# se respaldan en disco (cache_persistente) para acelerar el arranque en frío.
+# Sus salidas son de sólo lectura: el pipeline trabaja sobre copias livianas.
 
-@st.cache_data
+@st.cache_resource(show_spinner=False)
+def obtener_faker(locale='es_AR'):
+    """Instancia de Faker compartida por todo el proceso"""
+    return Faker(locale)
+
+@st.cache_resource(show_spinner=False)
+@en_cache_disco('caja')
 def generar_caja():
-    """Genera datos de Caja y Bancos"""
-    fake_es = Faker('es_AR')
+    """Genera datos de Caja y Bancos, con las cobranzas y pagos de los demás rubros"""
+    cuentas_cobrar = generar_cuentas_cobrar()
+    prepagos = generar_prepagos()
+    fake_es = obtener_faker('es_AR')
     np.random.seed(42)
     random.seed(42)
     
@@ -40,40 +68,59 @@ def generar_caja():
     responsables = [fake_es.name() for _ in range(10)]
     tipos_transaccion = ['Venta', 'Gasto']
     metodos_pago = ['Efectivo', 'Tarjeta de Débito', 'Tarjeta de Crédito', 'Transferencia']
-    saldo = 50000
+    hoy = datetime.now()
     registros = []
     
-    for i in range(num_registros):
-        fecha_hora = fake_es.date_time_between(start_date='-6M', end_date='now')
-        tipo = random.choice(tipos_transaccion)
-        monto = round(random.uniform(1000, 15000), 2)
-        
-        if tipo == 'Venta':
-            saldo += monto
-        else:
-            saldo -= monto
-        
+    for _ in range(num_registros):
+        registros.append({
+            'fecha_hora': fake_es.date_time_between(start_date='-6M', end_date='now'),
+            'tipo_transaccion': random.choice(tipos_transaccion),
+            'contraparte': fake_es.company(),
+            'monto': round(random.uniform(1000, 15000), 2)
+        })
+    
+    # Un 5% de las cobranzas y pagos no llega a Caja: son las partidas a conciliar
+    for _, cuenta in cuentas_cobrar[cuentas_cobrar['monto_cobrado'] > 0].iterrows():
+        if random.random() < 0.05:
+            continue
+        emision = datetime.combine(cuenta['fecha_emision'], datetime.min.time())
+        limite = min(datetime.combine(cuenta['fecha_vencimiento'], datetime.min.time()) + timedelta(days=30), hoy)
+        registros.append({
+            'fecha_hora': fake_es.date_time_between(start_date=emision, end_date=limite),
+            'tipo_transaccion': 'Cobranza',
+            'contraparte': cuenta['cliente'],
+            'monto': cuenta['monto_cobrado']
+        })
+    
+    for _, prepago in prepagos.iterrows():
+        if random.random() < 0.05:
+            continue
         registros.append({
-            'id_transaccion': i + 1,
-            'fecha_hora': fecha_hora.strftime('%Y-%m-%d %H:%M:%S'),
-            'tipo_transaccion': tipo,
-            'metodo_pago': random.choice(metodos_pago),
-            'monto': monto,
-            'saldo_acumulado': round(saldo, 2),
-            'responsable': random.choice(responsables)
+            'fecha_hora': datetime.combine(prepago['fecha_pago'], datetime.min.time())
+                          + timedelta(minutes=random.randint(8 * 60, 18 * 60)),
+            'tipo_transaccion': 'Pago',
+            'contraparte': prepago['proveedor'],
+            'monto': prepago['monto_total']
         })
     
     df = pd.DataFrame(registros)
-    df.sort_values(by='fecha_hora', inplace=True)
+    df.sort_values(by='fecha_hora', inplace=True, kind='stable')
     df.reset_index(drop=True, inplace=True)
+    ingreso = df['tipo_transaccion'].isin(['Venta', 'Cobranza'])
+    df.insert(0, 'id_transaccion', np.arange(1, len(df) + 1))
+    df['fecha_hora'] = df['fecha_hora'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    df.insert(4, 'metodo_pago', [random.choice(metodos_pago) for _ in range(len(df))])
+    df['saldo_acumulado'] = np.round(50000 + np.cumsum(np.where(ingreso, df['monto'], -df['monto'])), 2)
+    df['responsable'] = [random.choice(responsables) for _ in range(len(df))]
     return df
 
-@st.cache_data
+@st.cache_resource(show_spinner=False)
+@en_cache_disco('inversiones')
 def generar_inversiones():
     """Genera datos de Inversiones Temporarias"""
     np.random.seed(456)
     random.seed(456)
-    fake = Faker('es_AR')
+    fake = obtener_faker('es_AR')
     
     num_inversiones = 30
     tipos = ['Plazo Fijo', 'FCI', 'Acciones', 'Bonos', 'Cauciones']
@@ -83,6 +130,11 @@ def generar_inversiones():
         fecha_inicio = fake.date_between(start_date='-2y', end_date='today')
         monto_inicial = round(random.uniform(100000, 5000000), 2)
         tasa_anual = round(random.uniform(0.05, 0.15), 4)
+        dias = (datetime.now().date() - fecha_inicio).days
+        # Valor registrado: rendimiento devengado con pequeñas diferencias de registración
+        rendimiento = tasa_anual * dias / 365
+        if random.random() < 0.15:
+            rendimiento *= random.uniform(0.3, 1.8)
         
         inversiones.append({
             'id_inversion': f'INV-{20000 + i}',
@@ -90,18 +142,44 @@ def generar_inversiones():
             'fecha_inicio': fecha_inicio,
             'monto_inicial': monto_inicial,
             'tasa_anual': tasa_anual,
-            'valor_actual': round(monto_inicial * (1 + tasa_anual * random.uniform(0.8, 1.2)), 2),
+            'valor_actual': round(monto_inicial * (1 + rendimiento) * random.uniform(0.99, 1.01), 2),
             'estado': random.choice(['Activa', 'Liquidada'])
         })
     
     return pd.DataFrame(inversiones)
 
-@st.cache_data
+@st.cache_resource(show_spinner=False)
+@en_cache_disco('precios_inversiones')
+def generar_precios_inversiones():
+    """Genera la tabla de precios diarios de FCI, Acciones y Bonos"""
+    np.random.seed(789)
+    inversiones = generar_inversiones()
+    mercado = inversiones[inversiones['tipo'].isin(['FCI', 'Acciones', 'Bonos'])]
+    fechas = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=560)
+
+    precios = []
+    for _, inv in mercado.iterrows():
+        # Paseo aleatorio con deriva igual a la tasa del instrumento
+        retornos = np.random.normal(inv['tasa_anual'] / 252, 0.004, len(fechas))
+        serie = 100 * np.exp(np.cumsum(retornos))
+        precios.append(pd.DataFrame({
+            'id_inversion': inv['id_inversion'],
+            'fecha': fechas,
+            'precio': np.round(serie, 4)
+        }))
+
+    if not precios:
+        return pd.DataFrame({'id_inversion': pd.Series(dtype=object), 'fecha': pd.Series(dtype='datetime64[ns]'),
+                             'precio': pd.Series(dtype=np.float64)})
+    return pd.concat(precios, ignore_index=True)
+
+@st.cache_resource(show_spinner=False)
+@en_cache_disco('cuentas_cobrar')
 def generar_cuentas_cobrar():
     """Genera datos de Cuentas a Cobrar"""
     np.random.seed(123)
     random.seed(123)
-    fake = Faker('es_AR')
+    fake = obtener_faker('es_AR')
     
     num_cuentas = 40
     estados = ['Vigente', 'Vencida', 'Pagada']
@@ -134,12 +212,13 @@ def generar_cuentas_cobrar():
     
     return pd.DataFrame(cuentas)
 
-@st.cache_data
+@st.cache_resource(show_spinner=False)
+@en_cache_disco('inventarios')
 def generar_inventarios():
     """Genera datos de Inventarios"""
     np.random.seed(42)
     random.seed(42)
-    fake = Faker('es_AR')
+    fake = obtener_faker('es_AR')
     
     categorias = ['Materias Primas', 'Productos en Proceso', 'Productos Terminados']
     num_items = 60
@@ -162,12 +241,58 @@ def generar_inventarios():
     
     return pd.DataFrame(inventario)
 
-@st.cache_data
+@st.cache_resource(show_spinner=False)
+@en_cache_disco('movimientos_inventario')
+def generar_movimientos_inventario():
+    """Genera el historial de movimientos (kardex) consistente con el inventario"""
+    np.random.seed(77)
+    random.seed(77)
+    inventario = generar_inventarios()
+    hoy = pd.Timestamp.today().normalize()
+
+    movimientos = []
+    for _, item in inventario.iterrows():
+        # Un 10% de los ítems no registra salidas en el último año (candidatos a obsolescencia)
+        sin_salidas = random.random() < 0.10
+        total_entradas = item['cantidad'] * (1 if sin_salidas else random.uniform(1.5, 6))
+        num_entradas = random.randint(2, 8)
+        num_salidas = 0 if sin_salidas else random.randint(3, 15)
+
+        inicio = -730 if not sin_salidas else -900
+        fin = -1 if not sin_salidas else -400
+        cantidades_entrada = np.random.dirichlet(np.ones(num_entradas)) * total_entradas
+        for cantidad in cantidades_entrada:
+            movimientos.append({
+                'id_item': item['id_item'],
+                'fecha': hoy + timedelta(days=random.randint(inicio, fin)),
+                'tipo': 'Entrada',
+                'cantidad': round(cantidad, 2),
+                'costo_unitario': round(item['costo_unitario'] * random.uniform(0.85, 1.15), 2)
+            })
+
+        if num_salidas:
+            cantidades_salida = np.random.dirichlet(np.ones(num_salidas)) * (total_entradas - item['cantidad'])
+            for cantidad in cantidades_salida:
+                movimientos.append({
+                    'id_item': item['id_item'],
+                    'fecha': hoy + timedelta(days=random.randint(-700, -1)),
+                    'tipo': 'Salida',
+                    'cantidad': round(cantidad, 2),
+                    'costo_unitario': None
+                })
+
+    df = pd.DataFrame(movimientos)
+    df.sort_values(by=['id_item', 'fecha'], inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+@st.cache_resource(show_spinner=False)
+@en_cache_disco('prepagos')
 def generar_prepagos():
     """Genera datos de Gastos Pagados por Adelantado"""
     np.random.seed(42)
     random.seed(42)
-    fake = Faker('es_AR')
+    fake = obtener_faker('es_AR')
     
     tipos = ['Alquiler', 'Seguro', 'Publicidad', 'Licencias', 'Mantenimiento']
     num_registros = 20
@@ -194,33 +319,84 @@ def generar_prepagos():
 # FUNCIONES DE AUDITORÍA
 # ===============================================================
 
-def auditoria_isolation_forest(df, features, contamination=0.1):
-    """Aplica Isolation Forest para detectar anomalías"""
+# Columna que representa el importe auditable de cada rubro
+COLUMNA_IMPORTE = {
+    'Caja y Bancos': 'monto',
+    'Inversiones': 'monto_inicial',
+    'Cuentas a Cobrar': 'saldo_pendiente',
+    'Inventarios': 'valor_total',
+    'Prepagos': 'monto_total'
+}
+
+# Features del Isolation Forest por rubro
+FEATURES_IF = {
+    'Caja y Bancos': ['monto', 'saldo_acumulado'],
+    'Inversiones': ['monto_inicial', 'tasa_anual', 'valor_actual'],
+    'Cuentas a Cobrar': ['monto_original', 'saldo_pendiente'],
+    'Inventarios': ['cantidad', 'costo_unitario', 'valor_total'],
+    'Prepagos': ['monto_total', 'monto_mensual']
+}
+
+@st.cache_resource(show_spinner=False)
+def _modelo_compartido(huella, contamination, _X):
+    """Scaler e Isolation Forest ajustados, compartidos entre sesiones por huella de datos"""
+    return modelo_ajustado(_X, contamination, huella)
+
+@st.cache_resource(show_spinner=False)
+def _explicaciones_compartidas(huella, _modelo, _X_anomalos):
+    """Aportes por feature de las anomalías, compartidos entre sesiones junto al modelo"""
+    return explicaciones_guardadas(huella, lambda: contribuciones(_modelo, _X_anomalos))
+
+def auditoria_isolation_forest(df, features, contamination=0.1, presupuesto_mb=PRESUPUESTO_MEMORIA_MB):
+    """Aplica Isolation Forest para detectar anomalías y explica cada una por feature"""
+    if excede_presupuesto(len(df), len(features), presupuesto_mb):
+        # Fuera de memoria: matriz memory-mapped, escalado incremental y scoring por bloques
+        prediccion, score, scaler, modelo = isolation_forest_por_bloques(df, features, contamination, presupuesto_mb)
+        df = agregar_resultados_if(df, prediccion, score)
+        anomalos = np.flatnonzero(prediccion == -1)
+        return agregar_explicaciones(df, anomalos, explicar(modelo, scaler, df, features, anomalos), features)
+
     X = df[features].fillna(0)
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    huella = huella_datos(X, contamination)
+    scaler, modelo = _modelo_compartido(huella, contamination, X)
+    X_scaled = scaler.transform(X)
     
-    modelo = IsolationForest(n_estimators=100, contamination=contamination, random_state=42)
-    df['anomaly_if'] = modelo.fit_predict(X_scaled)
+    df['anomaly_if'] = modelo.predict(X_scaled)
     df['resultado_if'] = df['anomaly_if'].map({1: 'Normal', -1: 'Anómalo'})
-    
-    return df
+    # Score de anomalía: mayor valor = más anómalo
+    df['score_if'] = np.round(-modelo.score_samples(X_scaled), 4)
+
+    # Atribución por profundidad de cada anomalía (lote vectorizado sobre los árboles)
+    anomalos = np.flatnonzero(df['anomaly_if'].to_numpy() == -1)
+    aportes = _explicaciones_compartidas(huella, modelo, X_scaled[anomalos])
+    return agregar_explicaciones(df, anomalos, aportes, features)
+
+def _columna(df, nombre, defecto=0):
+    return df[nombre] if nombre in df.columns else pd.Series(defecto, index=df.index)
 
 def aplicar_reglas_negocio(df, rubro):
-    """Aplica reglas heurísticas según el rubro"""
-    if rubro == 'Caja':
-        df['alerta'] = df.apply(lambda r: 'Saldo negativo' if r.get('saldo_acumulado', 0) < 0 else None, axis=1)
+    """Aplica reglas heurísticas según el rubro (vectorizadas, aplicables por bloques)"""
+    if rubro in ('Caja', 'Caja y Bancos'):
+        df['alerta'] = np.where(_columna(df, 'saldo_acumulado') < 0, 'Saldo negativo', None)
     elif rubro == 'Inversiones':
-        df['alerta'] = df.apply(lambda r: 'Pérdida registrada' if r.get('valor_actual', 0) < r.get('monto_inicial', 0) else None, axis=1)
+        df['alerta'] = np.where(_columna(df, 'valor_actual') < _columna(df, 'monto_inicial'), 'Pérdida registrada', None)
+        if 'alerta_valuacion' in df.columns:
+            df['alerta'] = df['alerta'].fillna(df['alerta_valuacion'])
     elif rubro == 'Cuentas a Cobrar':
         hoy = pd.to_datetime('today')
         df['fecha_vencimiento'] = pd.to_datetime(df['fecha_vencimiento'])
-        df['alerta'] = df.apply(lambda r: f"Vencida {(hoy - r['fecha_vencimiento']).days} días" 
-                                if r['estado'] == 'Vencida' and r['saldo_pendiente'] > 0 else None, axis=1)
+        dias_vencida = (hoy - df['fecha_vencimiento']).dt.days
+        vencida = (df['estado'] == 'Vencida') & (df['saldo_pendiente'] > 0)
+        df['alerta'] = np.where(vencida, 'Vencida ' + dias_vencida.astype(str) + ' días', None)
     elif rubro == 'Inventarios':
-        df['alerta'] = df.apply(lambda r: 'Cantidad <= 0' if r.get('cantidad', 0) <= 0 else None, axis=1)
+        df['alerta'] = np.where(_columna(df, 'cantidad') <= 0, 'Cantidad <= 0', None)
+        if 'clasificacion_rotacion' in df.columns:
+            # Baja rotación / obsolescencia según el motor de valuación (RT 31)
+            df['alerta'] = df['alerta'].fillna(df['clasificacion_rotacion'])
     elif rubro == 'Prepagos':
-        df['alerta'] = df.apply(lambda r: 'Monto inválido' if r.get('monto_total', 0) <= 0 else None, axis=1)
+        df['alerta'] = np.where(_columna(df, 'monto_total') <= 0, 'Monto inválido', None)
+        if 'inconsistencia_devengamiento' in df.columns:
+            df['alerta'] = df['alerta'].fillna(df['inconsistencia_devengamiento'])
     
     return df
 
@@ -238,6 +414,8 @@ def generar_resumen_hallazgos(data_dict):
             total = df['saldo_pendiente'].sum()
         elif 'monto_inicial' in df.columns:
             total = df['monto_inicial'].sum()
+        elif 'saldo_no_devengado' in df.columns:
+            total = df['saldo_no_devengado'].sum()
         else:
             total = 0
         
@@ -248,7 +426,8 @@ def generar_resumen_hallazgos(data_dict):
             'Rubro': rubro,
             'Cantidad': cantidad,
             'Saldo ($)': round(total, 2),
-            'Anomalías': anomalias
+            'Anomalías': anomalias,
+            'Sin conciliar': partidas_sin_conciliar(df)
         })
         total_general += total
     
@@ -256,7 +435,8 @@ def generar_resumen_hallazgos(data_dict):
         'Rubro': 'TOTAL ACTIVOS CORRIENTES',
         'Cantidad': sum(r['Cantidad'] for r in resumen),
         'Saldo ($)': round(total_general, 2),
-        'Anomalías': sum(r['Anomalías'] for r in resumen)
+        'Anomalías': sum(r['Anomalías'] for r in resumen),
+        'Sin conciliar': sum(r['Sin conciliar'] for r in resumen)
     })
     
     return pd.DataFrame(resumen)
@@ -278,7 +458,8 @@ def mostrar_informes_auditoria():
     # Verificar si existe el directorio
     if not os.path.exists(ruta_informes):
         st.warning(f"⚠️ No se encontró el directorio de informes: {ruta_informes}")
-        st.info("Los informes se generarán automáticamente cuando se configure el sistema.")
+        st.info("Ejecute `python generar_informes_activos_corrientes.py` para generar un informe "
+                "por cada auditoría guardada.")
         return
     
     # Buscar archivos PDF
@@ -316,12 +497,328 @@ def mostrar_informes_auditoria():
                 )
 
 
+def mostrar_analisis_comparativo(empresa_nombre):
+    """Procedimientos analíticos (NIA 520) sobre los agregados por período guardados"""
+    st.header("📈 Análisis Comparativo Multi-Período")
+    st.markdown("Variaciones, ratios y tendencia calculados sobre agregados por período (NIA 520).")
+
+    almacen = AlmacenAgregados()
+    disponibles = {rubro: almacen.obtener(empresa_nombre, rubro) for rubro in COLUMNA_FECHA}
+    disponibles = {rubro: ag for rubro, ag in disponibles.items() if ag is not None and not ag.empty}
+    if not disponibles:
+        st.info("Todavía no hay períodos registrados: ejecute una auditoría para generarlos.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    rubro = col1.selectbox("Rubro", list(disponibles.keys()), key='comparativo_rubro')
+    frecuencia = col2.selectbox("Frecuencia", list(FRECUENCIAS.keys()), format_func=FRECUENCIAS.get,
+                                key='comparativo_frecuencia')
+    umbral = col3.slider("Umbral de variación significativa", 0.05, 1.0, UMBRAL_VARIACION, 0.05,
+                         key='comparativo_umbral')
+
+    analisis = variaciones(disponibles[rubro], frecuencia, umbral)
+    significativas = analisis['fluctuacion'].notna()
+    completos = analisis[analisis['periodo_completo']]
+
+    col4, col5, col6 = st.columns(3)
+    col4.metric("Períodos", len(analisis))
+    col5.metric("Fluctuaciones significativas", int(significativas.sum()))
+    col6.metric("Importe último período completo", f"${completos['importe'].iloc[-1]:,.2f}")
+    if len(completos) < len(analisis):
+        st.caption("Los períodos posteriores a la fecha de corte están incompletos: "
+                   "se muestran sin variaciones ni tendencia.")
+
+    st.line_chart(analisis[['importe', 'tendencia']])
+    if significativas.any():
+        st.subheader("⚠️ Fluctuaciones a investigar")
+        st.dataframe(analisis[significativas], use_container_width=True)
+    st.subheader("Detalle por período")
+    st.dataframe(analisis, use_container_width=True)
+
+
+def ejecutar_auditoria(rubros_seleccionados, fecha_corte, presupuesto_mb=PRESUPUESTO_MEMORIA_MB):
+    """Ejecuta generación, Isolation Forest y reglas para los rubros seleccionados"""
+    data_dict = {}
+    if "Caja y Bancos" in rubros_seleccionados:
+        df = generar_caja().copy(deep=False)
+        df = auditoria_isolation_forest(df, FEATURES_IF['Caja y Bancos'], presupuesto_mb=presupuesto_mb)
+        df = aplicar_reglas_negocio(df, 'Caja')
+        data_dict['Caja y Bancos'] = df
+
+    if "Inversiones Temporarias" in rubros_seleccionados:
+        df = generar_inversiones()
+        df = valuar_inversiones(df, generar_precios_inversiones(), fecha_corte)
+        df = auditoria_isolation_forest(df, FEATURES_IF['Inversiones'], presupuesto_mb=presupuesto_mb)
+        df = aplicar_reglas_negocio(df, 'Inversiones')
+        data_dict['Inversiones'] = df
+
+    if "Cuentas a Cobrar" in rubros_seleccionados:
+        df = generar_cuentas_cobrar().copy(deep=False)
+        df = auditoria_isolation_forest(df, FEATURES_IF['Cuentas a Cobrar'], presupuesto_mb=presupuesto_mb)
+        df = aplicar_reglas_negocio(df, 'Cuentas a Cobrar')
+        data_dict['Cuentas a Cobrar'] = df
+
+    if "Inventarios" in rubros_seleccionados:
+        df = generar_inventarios()
+        valuacion = valuar_inventario(generar_movimientos_inventario(), fecha_corte)
+        df = df.merge(valuacion, on='id_item', how='left')
+        df = auditoria_isolation_forest(df, FEATURES_IF['Inventarios'], presupuesto_mb=presupuesto_mb)
+        df = aplicar_reglas_negocio(df, 'Inventarios')
+        data_dict['Inventarios'] = df
+
+    if "Gastos Pagados por Adelantado" in rubros_seleccionados:
+        df = generar_prepagos()
+        df = auditar_devengamiento(df, fecha_corte)
+        df = auditoria_isolation_forest(df, FEATURES_IF['Prepagos'], presupuesto_mb=presupuesto_mb)
+        df = aplicar_reglas_negocio(df, 'Prepagos')
+        data_dict['Prepagos'] = df
+
+    return conciliar_rubros(data_dict)
+
+
+def _grafico_rubro_png(rubro, df):
+    """Genera el gráfico de un rubro y lo devuelve como PNG"""
+    fig, ax = plt.subplots(figsize=(10, 4))
+    if rubro == 'Caja y Bancos':
+        ax.plot(pd.to_datetime(df['fecha_hora']), df['saldo_acumulado'])
+    else:
+        sns.scatterplot(data=df, x=df.columns[3], y=df.columns[4], hue='resultado_if', ax=ax)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def mostrar_muestreo(resultado, almacen, clave):
+    """Selección de muestras para pruebas sustantivas sobre los resultados guardados"""
+    st.header("🎯 III. Muestreo para Pruebas Sustantivas (NIA 530)")
+    data_dict = resultado['data_dict']
+    if not data_dict:
+        st.info("La auditoría no incluye rubros para muestrear.")
+        return
+    muestras = resultado.setdefault('muestras', {})
+
+    col1, col2, col3 = st.columns(3)
+    rubro = col1.selectbox("Rubro", list(data_dict.keys()), key='muestreo_rubro')
+    metodo = col2.selectbox("Método", list(METODOS_MUESTREO.keys()),
+                            format_func=METODOS_MUESTREO.get, key='muestreo_metodo')
+    confianza = col3.selectbox("Nivel de confianza", list(FACTORES_CONFIANZA.keys()), index=2,
+                               format_func=lambda c: f"{c:.0%}", key='muestreo_confianza')
+
+    df = data_dict[rubro]
+    columna = COLUMNA_IMPORTE[rubro]
+    valor_poblacion = float(df[columna].abs().sum())
+    col4, col5 = st.columns(2)
+    materialidad = col4.number_input("Materialidad tolerable ($)", min_value=1.0,
+                                     value=max(round(valor_poblacion * 0.05, 2), 1.0),
+                                     key=f'muestreo_materialidad_{rubro}')
+    semilla = col5.number_input("Semilla", min_value=0, value=42, step=1, key='muestreo_semilla')
+
+    if st.button("🎯 Seleccionar Muestra"):
+        try:
+            muestra = seleccionar_muestra(df, columna, metodo, materialidad, confianza, semilla=int(semilla))
+            columnas = [df.columns[0], columna, 'resultado_if', 'alerta', 'metodo_muestreo']
+            if 'estrato' in muestra.columns:
+                columnas.append('estrato')
+            muestras[rubro] = muestra[columnas]
+            resultado.pop('informe_docx', None)
+            almacen.guardar_artefacto(clave, 'muestras', muestras)
+        except ValueError as e:
+            st.error(f"Error: {e}")
+
+    if rubro in muestras:
+        st.caption(f"{len(muestras[rubro])} partidas seleccionadas de {len(df)} "
+                   f"({muestras[rubro]['metodo_muestreo'].iloc[0]}). Se incluyen como anexo del informe.")
+        st.dataframe(muestras[rubro], use_container_width=True)
+
+
+def mostrar_consultas_sql(resultado):
+    """Consultas SQL ad-hoc (DuckDB) sobre los resultados guardados"""
+    st.sidebar.markdown("---")
+    st.sidebar.header("🧮 Consultas SQL")
+    if not duckdb_disponible():
+        st.sidebar.info("Instale DuckDB para habilitar las consultas SQL.")
+        return
+
+    # La conexión no es serializable: vive en la sesión junto al resultado que registra
+    consultor = st.session_state.get('consultor_sql')
+    if consultor is None or consultor.data_dict is not resultado['data_dict']:
+        if consultor is not None:
+            consultor.cerrar()
+        consultor = ConsultorSQL(resultado['data_dict'])
+        st.session_state['consultor_sql'] = consultor
+    if not consultor.tablas:
+        st.sidebar.info("No hay rubros auditados para consultar.")
+        return
+
+    predefinidas = consultor.consultas_disponibles()
+    nombre = st.sidebar.selectbox("Consulta predefinida", ["(personalizada)"] + list(predefinidas.keys()))
+    sql_inicial = predefinidas.get(nombre, f"SELECT * FROM {next(iter(consultor.tablas))} LIMIT 100")
+    sql = st.sidebar.text_area("SQL", " ".join(sql_inicial.split()), height=150)
+    st.sidebar.caption("Tablas: " + ", ".join(consultor.tablas.keys()))
+
+    if st.sidebar.button("▶️ Ejecutar Consulta"):
+        st.session_state['consulta_sql'] = sql
+
+    sql_ejecutada = st.session_state.get('consulta_sql')
+    if sql_ejecutada:
+        st.header("🧮 Consulta Analítica")
+        st.code(sql_ejecutada, language='sql')
+        try:
+            tabla, truncada = consultor.consultar(sql_ejecutada)
+            st.caption(f"Primeras {tabla.num_rows} filas (resultado truncado)" if truncada
+                       else f"{tabla.num_rows} filas")
+            st.dataframe(tabla, use_container_width=True)
+        except Exception as e:
+            st.error(f"Error en la consulta: {e}")
+
+
+FORMATOS_EXPORTACION = {
+    'xlsx': ("📊 Exportar Papeles de Trabajo (XLSX)", 'exportar_xlsx',
+             "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    'zip': ("🗜️ Exportar Papeles de Trabajo (CSV comprimido)", 'exportar_csv_zip', "application/zip")
+}
+
+
+def mostrar_exportacion(resultado, almacen, clave, empresa_nombre):
+    """Exporta la población auditada completa como papeles de trabajo"""
+    # Los archivos se escriben en disco por bloques y en la sesión sólo se guarda su ruta
+    exportaciones = resultado.setdefault('exportaciones', {})
+    columnas = st.columns(len(FORMATOS_EXPORTACION))
+    for col, (formato, (etiqueta, exportar, mime)) in zip(columnas, FORMATOS_EXPORTACION.items()):
+        if col.button(etiqueta):
+            try:
+                # Importación diferida: openpyxl sólo se carga al exportar
+                import exportacion_papeles
+                with st.spinner('Exportando población auditada...'):
+                    # Archivo propio de la sesión: otras sesiones con la misma configuración no lo pisan
+                    os.makedirs(DIRECTORIO_EXPORTACIONES, exist_ok=True)
+                    fd, ruta = tempfile.mkstemp(prefix=f"papeles_{clave}_", suffix=f".{formato}",
+                                                dir=DIRECTORIO_EXPORTACIONES)
+                    os.close(fd)
+                    try:
+                        getattr(exportacion_papeles, exportar)(resultado['data_dict'], ruta)
+                    except Exception:
+                        eliminar_archivo(ruta)
+                        raise
+                    eliminar_archivo(exportaciones.get(formato))
+                    exportaciones[formato] = ruta
+                    almacen.guardar_artefacto(clave, 'exportaciones', exportaciones)
+                    podar_directorio(DIRECTORIO_EXPORTACIONES, 'papeles_', '', MAX_EXPORTACIONES_DISCO,
+                                     EDAD_MAXIMA_DIAS)
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+        ruta = exportaciones.get(formato)
+        if ruta and os.path.exists(ruta):
+            with open(ruta, 'rb') as f:
+                col.download_button(f"💾 Descargar {formato.upper()}", f,
+                                    file_name=f"Papeles_Trabajo_{empresa_nombre}.{formato}", mime=mime)
+
+
+def mostrar_resultados(resultado, almacen, clave, empresa_nombre, empresa_cuit, fecha_auditoria):
+    """Muestra los resultados guardados sin recalcular la auditoría"""
+    data_dict = resultado['data_dict']
+    resumen_df = resultado['resumen_df']
+
+    # Resumen Ejecutivo
+    st.header("📋 I. Resumen Ejecutivo")
+
+    col1, col2, col3, col4 = st.columns(4)
+    total_row = resumen_df[resumen_df['Rubro'] == 'TOTAL ACTIVOS CORRIENTES'].iloc[0]
+    col1.metric("Total Activos", f"${total_row['Saldo ($)']:,.2f}")
+    col2.metric("Items Auditados", int(total_row['Cantidad']))
+    col3.metric("Anomalías", int(total_row['Anomalías']))
+    col4.metric("% Anomalías", f"{(total_row['Anomalías']/total_row['Cantidad']*100):.1f}%")
+
+    st.dataframe(resumen_df, use_container_width=True)
+
+    # Hallazgos Detallados: sólo se envía al navegador la página visible
+    st.header("🔍 II. Hallazgos Detallados")
+    alertas = resultado.setdefault('opciones_alerta', {})
+    graficos = resultado.setdefault('graficos', {})
+    for rubro, df in data_dict.items():
+        with st.expander(f"📂 {rubro}"):
+            if rubro not in alertas:
+                alertas[rubro] = opciones_alerta(df)
+            columnas_orden = ['materialidad', 'score_if', COLUMNA_IMPORTE[rubro]]
+            col1, col2, col3 = st.columns([2, 2, 1])
+            alerta = col1.selectbox("Alerta", alertas[rubro], key=f'visor_alerta_{rubro}')
+            orden = col2.selectbox("Ordenar por", columnas_orden, key=f'visor_orden_{rubro}')
+            total = contar_hallazgos(df, alerta)
+            paginas = max((total + TAMANO_PAGINA - 1) // TAMANO_PAGINA, 1)
+            clave_pagina = f'visor_pagina_{rubro}'
+            if st.session_state.get(clave_pagina, 1) > paginas:
+                # El filtro cambió y la página elegida ya no existe
+                st.session_state[clave_pagina] = paginas
+            pagina = col3.number_input("Página", min_value=1, max_value=paginas, value=1, step=1, key=clave_pagina)
+
+            hallazgos, total = pagina_hallazgos(df, COLUMNA_IMPORTE[rubro], pagina - 1,
+                                                alerta=alerta, orden=orden)
+            desde = (pagina - 1) * TAMANO_PAGINA
+            if hallazgos.empty:
+                st.caption(f"Sin hallazgos · página {pagina} de {paginas}")
+            else:
+                st.caption(f"Hallazgos {desde + 1}–{desde + len(hallazgos)} de {total} "
+                           f"· página {pagina} de {paginas}")
+            st.dataframe(hallazgos, use_container_width=True)
+            if columnas_aporte(hallazgos) and not hallazgos.empty:
+                fila = st.selectbox("Explicación del hallazgo", hallazgos.index, key=f'visor_detalle_{rubro}')
+                aportes = aportes_registro(hallazgos.loc[fila])
+                st.caption(f"Factor principal: {hallazgos.loc[fila, COLUMNA_FACTOR]} · "
+                           "aporte de cada feature al aislamiento del registro")
+                st.bar_chart(aportes)
+            if rubro not in graficos:
+                graficos[rubro] = _grafico_rubro_png(rubro, df)
+            st.image(graficos[rubro], use_container_width=True)
+
+    mostrar_muestreo(resultado, almacen, clave)
+
+    # Descargas: tabla y gráfico se construyen una vez y se comparten entre DOCX y PDF
+    st.header("📥 IV. Generación de Informe")
+    if 'componentes' not in resultado:
+        resultado['componentes'] = construir_componentes(resumen_df, data_dict, fecha_auditoria)
+    componentes = resultado['componentes']
+
+    col1, col2 = st.columns(2)
+    if col1.button("📄 Generar Informe Word (DOCX)"):
+        try:
+            generador = GeneradorInformeAuditoria(empresa_nombre, empresa_cuit, fecha_auditoria)
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp:
+                generador.generar_informe(resumen_df, data_dict, tmp.name,
+                                          muestras=resultado.get('muestras'), componentes=componentes)
+                with open(tmp.name, 'rb') as f:
+                    almacen.guardar_artefacto(clave, 'informe_docx', f.read())
+            os.unlink(tmp.name)
+        except Exception as e:
+            st.error(f"Error: {e}")
+
+    if col2.button("📕 Generar Informe PDF"):
+        # Importación diferida: reportlab sólo se carga al generar el PDF
+        from generar_informes_activos_corrientes import GeneradorInformePDFActivosCorrientes
+        buffer = io.BytesIO()
+        generador = GeneradorInformePDFActivosCorrientes(fecha_auditoria.year, componentes)
+        if generador.generar_informe(buffer):
+            almacen.guardar_artefacto(clave, 'informe_pdf', buffer.getvalue())
+        else:
+            st.error("Error al generar el informe PDF")
+
+    if 'informe_docx' in resultado:
+        col1.download_button("💾 Descargar Informe", resultado['informe_docx'],
+                             file_name=f"Informe_{empresa_nombre}.docx")
+    if 'informe_pdf' in resultado:
+        col2.download_button("💾 Descargar Informe PDF", resultado['informe_pdf'],
+                             file_name=f"Informe_{empresa_nombre}.pdf", mime="application/pdf")
+
+    mostrar_exportacion(resultado, almacen, clave, empresa_nombre)
+
+
 def main():
     st.title("📊 Sistema de Auditoría de Activos Corrientes")
     st.markdown("### Conforme a RT 7, RT 37 y Normas Internacionales de Auditoría (NIAs)")
     
     # Crear pestañas
-    tab1, tab2 = st.tabs(["🔍 Análisis y Auditoría", "📄 Informes de Auditoría"])
+    tab1, tab2, tab3 = st.tabs(["🔍 Análisis y Auditoría", "📄 Informes de Auditoría", "📈 Análisis Comparativo"])
     
     with tab1:
         st.sidebar.header("⚙️ Configuración de Auditoría")
@@ -335,81 +832,39 @@ def main():
             default=["Caja y Bancos", "Inversiones Temporarias", "Cuentas a Cobrar"]
             )
         
-        if st.sidebar.button("🚀 Iniciar Auditoría Completa", type="primary"):
+        with st.sidebar.expander("Opciones avanzadas"):
+            presupuesto_mb = st.number_input(
+                "Presupuesto de memoria (MB)", min_value=64, value=PRESUPUESTO_MEMORIA_MB, step=256,
+                help="Por encima de este presupuesto la detección de anomalías se ejecuta por bloques en disco")
+        
+        almacen = AlmacenResultados(st.session_state)
+        clave = clave_configuracion(rubros_seleccionados, empresa_nombre, fecha_auditoria)
+        
+        iniciar = st.sidebar.button("🚀 Iniciar Auditoría Completa", type="primary")
+        if iniciar and not rubros_seleccionados:
+            st.warning("⚠️ Seleccione al menos un rubro para auditar.")
+        elif iniciar:
             with st.spinner('Ejecutando auditoría integral...'):
-                data_dict = {}
-                if "Caja y Bancos" in rubros_seleccionados:
-                    df = generar_caja()
-                    df = auditoria_isolation_forest(df, ['monto', 'saldo_acumulado'])
-                    df = aplicar_reglas_negocio(df, 'Caja')
-                    data_dict['Caja y Bancos'] = df
-                
-                if "Inversiones Temporarias" in rubros_seleccionados:
-                    df = generar_inversiones()
-                    df = auditoria_isolation_forest(df, ['monto_inicial', 'tasa_anual', 'valor_actual'])
-                    df = aplicar_reglas_negocio(df, 'Inversiones')
-                    data_dict['Inversiones'] = df
-                
-                if "Cuentas a Cobrar" in rubros_seleccionados:
-                    df = generar_cuentas_cobrar()
-                    df = auditoria_isolation_forest(df, ['monto_original', 'saldo_pendiente'])
-                    df = aplicar_reglas_negocio(df, 'Cuentas a Cobrar')
-                    data_dict['Cuentas a Cobrar'] = df
-
-                if "Inventarios" in rubros_seleccionados:
-                    df = generar_inventarios()
-                    df = auditoria_isolation_forest(df, ['cantidad', 'costo_unitario', 'valor_total'])
-                    df = aplicar_reglas_negocio(df, 'Inventarios')
-                    data_dict['Inventarios'] = df
-
-                if "Gastos Pagados por Adelantado" in rubros_seleccionados:
-                    df = generar_prepagos()
-                    df = auditoria_isolation_forest(df, ['monto_total', 'monto_mensual'])
-                    df = aplicar_reglas_negocio(df, 'Prepagos')
-                    data_dict['Prepagos'] = df
-
-                st.success("✅ Auditoría completada con éxito")
-                
-                # Resumen Ejecutivo
-                st.header("📋 I. Resumen Ejecutivo")
+                data_dict = ejecutar_auditoria(rubros_seleccionados, fecha_auditoria, presupuesto_mb)
                 resumen_df = generar_resumen_hallazgos(data_dict)
-                
-                col1, col2, col3, col4 = st.columns(4)
-                total_row = resumen_df[resumen_df['Rubro'] == 'TOTAL ACTIVOS CORRIENTES'].iloc[0]
-                col1.metric("Total Activos", f"${total_row['Saldo ($)']:,.2f}")
-                col2.metric("Items Auditados", int(total_row['Cantidad']))
-                col3.metric("Anomalías", int(total_row['Anomalías']))
-                col4.metric("% Anomalías", f"{(total_row['Anomalías']/total_row['Cantidad']*100):.1f}%")
-                
-                st.dataframe(resumen_df, use_container_width=True)
-                
-                # Hallazgos Detallados
-                st.header("🔍 II. Hallazgos Detallados")
-                for rubro, df in data_dict.items():
-                    with st.expander(f"📂 {rubro}"):
-                        st.dataframe(df[df['resultado_if'] == 'Anómalo'], use_container_width=True)
-                        fig, ax = plt.subplots(figsize=(10, 4))
-                        if rubro == 'Caja y Bancos':
-                            plt.plot(pd.to_datetime(df['fecha_hora']), df['saldo_acumulado'])
-                        else:
-                            sns.scatterplot(data=df, x=df.columns[3], y=df.columns[4], hue='resultado_if')
-                        st.pyplot(fig)
-
-                # Descargas
-                st.header("📥 III. Generación de Informe")
-                if st.button("📄 Generar Informe Word (DOCX)"):
-                    try:
-                        generador = GeneradorInformeAuditoria(empresa_nombre, empresa_cuit, fecha_auditoria)
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp:
-                            generador.generar_informe(resumen_df, data_dict, tmp.name)
-                            with open(tmp.name, 'rb') as f:
-                                st.download_button("💾 Descargar Informe", f.read(), 
-                                                 file_name=f"Informe_{empresa_nombre}.docx")
-                    except Exception as e:
-                        st.error(f"Error: {e}")
+                configuracion = {'rubros': rubros_seleccionados, 'empresa': empresa_nombre, 'fecha': fecha_auditoria}
+                almacen.guardar(clave, {'data_dict': data_dict, 'resumen_df': resumen_df,
+                                        'configuracion': configuracion})
+                registrar_periodos(AlmacenAgregados(), empresa_nombre, data_dict, COLUMNA_IMPORTE, fecha_auditoria)
+                st.success("✅ Auditoría completada con éxito")
+        
+        resultado = almacen.obtener(clave)
+        if resultado is not None:
+            mostrar_resultados(resultado, almacen, clave, empresa_nombre, empresa_cuit, fecha_auditoria)
+            mostrar_consultas_sql(resultado)
+        else:
+            st.info("Configure los parámetros y presione \"Iniciar Auditoría Completa\".")
     
     with tab2:
         mostrar_informes_auditoria()
+    
+    with tab3:
+        mostrar_analisis_comparativo(empresa_nombre)
 
 
 if __name__ == '__main__':
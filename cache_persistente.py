@@ -0,0 +1,114 @@
+"""
+CACHÉ PERSISTENTE DE DATOS Y MODELOS
+Guarda en disco las salidas de los generadores de datos, los modelos
+(StandardScaler + Isolation Forest) ya ajustados y las explicaciones de sus
+anomalías, para que un proceso nuevo (arranque en frío del servicio) los
+cargue en lugar de recalcularlos. El script precalentamiento.py los
+construye durante el build.
+
+Los datos generados se fechan respecto del día en que se generan, pero su
+clave en disco es la versión de los generadores (VERSION_DATOS), no el día:
+lo construido en el build sigue vigente en los días siguientes, igual que en
+la caché en memoria del proceso, y los modelos (cuya huella depende de los
+datos) siguen coincidiendo. Al cambiar un generador se incrementa la versión.
+Los modelos y explicaciones se podan por cantidad y antigüedad de su último uso.
+"""
+
+import functools
+import glob
+import hashlib
+import os
+import pickle
+
+import joblib
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+from almacen_resultados import DIRECTORIO_CACHE, EDAD_MAXIMA_DIAS, escribir_atomico, podar_directorio
+
+DIRECTORIO_GENERADORES = os.path.join(DIRECTORIO_CACHE, 'generadores')
+DIRECTORIO_MODELOS = os.path.join(DIRECTORIO_CACHE, 'modelos')
+VERSION_DATOS = 2
+MAX_MODELOS_DISCO = 40
+
+
+def en_cache_disco(nombre):
+    """
+    Decorador para generadores sin argumentos: persiste su salida en disco.
+
+    La clave es la versión de los generadores; las versiones anteriores se
+    descartan al regenerar.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura():
+            ruta = os.path.join(DIRECTORIO_GENERADORES, f"{nombre}_v{VERSION_DATOS}.pkl")
+            if os.path.exists(ruta):
+                try:
+                    with open(ruta, 'rb') as f:
+                        return pickle.load(f)
+                except (OSError, pickle.UnpicklingError, EOFError):
+                    pass
+
+            resultado = funcion()
+            try:
+                for anterior in glob.glob(os.path.join(DIRECTORIO_GENERADORES, f"{nombre}_*.pkl")):
+                    os.remove(anterior)
+                escribir_atomico(DIRECTORIO_GENERADORES, ruta,
+                                 lambda f: pickle.dump(resultado, f, protocol=pickle.HIGHEST_PROTOCOL))
+            except OSError:
+                pass
+            return resultado
+        return envoltura
+    return decorador
+
+
+def huella_datos(X, contamination):
+    """Huella estable de la matriz de features y los parámetros del modelo"""
+    huella = hashlib.sha1()
+    huella.update('|'.join(map(str, X.columns)).encode('utf-8'))
+    huella.update(str(contamination).encode('utf-8'))
+    huella.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    return huella.hexdigest()[:20]
+
+
+def _cargar_o_calcular(ruta, calcular, prefijo):
+    """Carga un objeto joblib de `ruta` o lo calcula, lo guarda y poda los de su tipo"""
+    if os.path.exists(ruta):
+        try:
+            resultado = joblib.load(ruta)
+            # La fecha de modificación marca el último uso para la poda
+            os.utime(ruta)
+            return resultado
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+
+    resultado = calcular()
+    try:
+        escribir_atomico(os.path.dirname(ruta), ruta, lambda f: joblib.dump(resultado, f))
+    except OSError:
+        pass
+    podar_directorio(os.path.dirname(ruta), prefijo, '.joblib', MAX_MODELOS_DISCO, EDAD_MAXIMA_DIAS)
+    return resultado
+
+
+def modelo_ajustado(X, contamination=0.1, huella=None):
+    """Devuelve (scaler, modelo) ajustados sobre X, desde disco si ya existen"""
+    huella = huella or huella_datos(X, contamination)
+
+    def ajustar():
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+        modelo = IsolationForest(n_estimators=100, contamination=contamination, random_state=42)
+        modelo.fit(X_scaled)
+        return scaler, modelo
+
+    return _cargar_o_calcular(os.path.join(DIRECTORIO_MODELOS, f"isolation_forest_{huella}.joblib"), ajustar,
+                              'isolation_forest_')
+
+
+def explicaciones_guardadas(huella, calcular):
+    """Aportes por feature de las anomalías del modelo `huella`, guardados junto al modelo"""
+    return _cargar_o_calcular(os.path.join(DIRECTORIO_MODELOS, f"explicaciones_{huella}.joblib"), calcular,
+                              'explicaciones_')
@@ -0,0 +1,149 @@
+"""
+COMPONENTES COMPARTIDOS DE LOS INFORMES (PDF y DOCX)
+Reduce los resultados de la auditoría (resumen_df y data_dict) a agregados
+livianos y construye una sola vez el gráfico y la tabla que reutilizan ambos
+generadores. Los renderizadores sólo reciben estos agregados, por lo que el
+costo de emitir un informe no depende de la cantidad de filas auditadas.
+"""
+
+import io
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+FILA_TOTAL = 'TOTAL ACTIVOS CORRIENTES'
+
+
+def _contar(mascara):
+    return int(np.count_nonzero(np.asarray(mascara, dtype=bool)))
+
+
+def _metricas_rubro(rubro, df, fecha_corte):
+    """Métricas específicas de cada rubro para la narrativa"""
+    columnas = df.columns
+    if rubro == 'Caja y Bancos':
+        return {
+            'saldo_final': float(df['saldo_acumulado'].iloc[-1]) if 'saldo_acumulado' in columnas and len(df) else 0.0,
+            'saldos_negativos': _contar(df['saldo_acumulado'] < 0) if 'saldo_acumulado' in columnas else 0,
+            'monto_maximo': float(df['monto'].max()) if 'monto' in columnas and len(df) else 0.0
+        }
+    if rubro in ('Inversiones', 'Inversiones Temporarias'):
+        desvios = df['alerta_valuacion'].notna() if 'alerta_valuacion' in columnas else np.zeros(len(df), bool)
+        return {
+            'activas': _contar(df['estado'] == 'Activa') if 'estado' in columnas else len(df),
+            'desvios': _contar(desvios),
+            'desvio_total': float(df.loc[desvios, 'desvio_valuacion'].sum()) if 'desvio_valuacion' in columnas else 0.0
+        }
+    if rubro == 'Cuentas a Cobrar':
+        if 'estado' not in columnas:
+            return {'vencidas': 0, 'mora_90': 0, 'saldo_vencido': 0.0}
+        vencidas = (df['estado'] == 'Vencida') & (df['saldo_pendiente'] > 0)
+        mora_90 = 0
+        if 'fecha_vencimiento' in columnas:
+            dias = (pd.Timestamp(fecha_corte) - pd.to_datetime(df['fecha_vencimiento'])).dt.days
+            mora_90 = _contar(vencidas & (dias > 90))
+        return {
+            'vencidas': _contar(vencidas),
+            'mora_90': mora_90,
+            'saldo_vencido': float(df.loc[vencidas, 'saldo_pendiente'].sum())
+        }
+    if rubro == 'Inventarios':
+        clasificacion = df['clasificacion_rotacion'] if 'clasificacion_rotacion' in columnas else pd.Series(dtype=object)
+        obsoletos = (clasificacion == 'Obsoleto').to_numpy()
+        return {
+            'baja_rotacion': _contar(clasificacion == 'Baja rotación'),
+            'obsoletos': _contar(obsoletos),
+            'valor_obsoleto': float(df.loc[obsoletos, 'valor_fifo'].sum()) if 'valor_fifo' in columnas else 0.0
+        }
+    if rubro in ('Prepagos', 'Gastos Pagados por Adelantado'):
+        if 'inconsistencia_devengamiento' in columnas:
+            devengados = df['inconsistencia_devengamiento'].astype(str).str.startswith('Totalmente devengado')
+        else:
+            devengados = np.zeros(len(df), bool)
+        return {
+            'saldo_no_devengado': float(df['saldo_no_devengado'].sum()) if 'saldo_no_devengado' in columnas else 0.0,
+            'totalmente_devengados': _contar(devengados),
+            'monto_reclasificar': float(df.loc[devengados, 'monto_total'].sum()) if 'monto_total' in columnas else 0.0
+        }
+    return {}
+
+
+def calcular_agregados(resumen_df, data_dict, fecha_corte=None):
+    """Reduce los resultados de la auditoría a los agregados que consumen los informes"""
+    fecha_corte = pd.Timestamp.today().normalize() if fecha_corte is None else pd.Timestamp(fecha_corte)
+    resumen = resumen_df.set_index('Rubro')
+
+    rubros = []
+    for rubro, df in data_dict.items():
+        fila = resumen.loc[rubro] if rubro in resumen.index else None
+        alertas = df['alerta'].value_counts().head(5) if 'alerta' in df.columns else pd.Series(dtype=int)
+        rubros.append({
+            'rubro': rubro,
+            'cantidad': int(fila['Cantidad']) if fila is not None else len(df),
+            'saldo': float(fila['Saldo ($)']) if fila is not None else 0.0,
+            'anomalias': int(fila['Anomalías']) if fila is not None else 0,
+            'sin_conciliar': int(fila.get('Sin conciliar', 0)) if fila is not None else 0,
+            'con_alerta': int(df['alerta'].notna().sum()) if 'alerta' in df.columns else 0,
+            'alertas': {str(k): int(v) for k, v in alertas.items()},
+            'metricas': _metricas_rubro(rubro, df, fecha_corte)
+        })
+
+    total = resumen.loc[FILA_TOTAL] if FILA_TOTAL in resumen.index else None
+    return {
+        'fecha_corte': fecha_corte.date(),
+        'rubros': rubros,
+        'total_cantidad': int(total['Cantidad']) if total is not None else sum(r['cantidad'] for r in rubros),
+        'total_saldo': float(total['Saldo ($)']) if total is not None else sum(r['saldo'] for r in rubros),
+        'total_anomalias': int(total['Anomalías']) if total is not None else sum(r['anomalias'] for r in rubros),
+        'total_sin_conciliar': int(total.get('Sin conciliar', 0)) if total is not None else sum(r['sin_conciliar'] for r in rubros)
+    }
+
+
+def filas_tabla_resumen(agregados):
+    """Filas de la tabla resumen (encabezado incluido) como texto"""
+    filas = [['Rubro', 'Cantidad', 'Saldo ($)', 'Anomalías', 'Con alerta', 'Sin conciliar']]
+    for r in agregados['rubros']:
+        filas.append([r['rubro'], f"{r['cantidad']:,}", f"{r['saldo']:,.2f}",
+                      f"{r['anomalias']:,}", f"{r['con_alerta']:,}", f"{r['sin_conciliar']:,}"])
+    filas.append(['TOTAL', f"{agregados['total_cantidad']:,}", f"{agregados['total_saldo']:,.2f}",
+                  f"{agregados['total_anomalias']:,}",
+                  f"{sum(r['con_alerta'] for r in agregados['rubros']):,}",
+                  f"{agregados['total_sin_conciliar']:,}"])
+    return filas
+
+
+@lru_cache(maxsize=32)
+def _grafico_saldos(rubros, saldos, anomalias):
+    fig, ax = plt.subplots(figsize=(8, 3.5))
+    posiciones = np.arange(len(rubros))
+    ax.barh(posiciones, saldos, color='#283593')
+    ax.set_yticks(posiciones, labels=[f"{r} ({a} anom.)" for r, a in zip(rubros, anomalias)])
+    ax.invert_yaxis()
+    ax.set_xlabel('Saldo ($)')
+    ax.ticklabel_format(axis='x', style='plain')
+    ax.set_title('Composición de Activos Corrientes')
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def grafico_saldos_png(agregados):
+    """Gráfico de saldos por rubro en PNG (se construye una vez por juego de agregados)"""
+    return _grafico_saldos(
+        tuple(r['rubro'] for r in agregados['rubros']),
+        tuple(round(r['saldo'], 2) for r in agregados['rubros']),
+        tuple(r['anomalias'] for r in agregados['rubros'])
+    )
+
+
+def construir_componentes(resumen_df, data_dict, fecha_corte=None):
+    """Agregados, tabla y gráfico listos para reutilizar en PDF y DOCX"""
+    agregados = calcular_agregados(resumen_df, data_dict, fecha_corte)
+    return {
+        'agregados': agregados,
+        'tabla_resumen': filas_tabla_resumen(agregados),
+        'grafico_saldos': grafico_saldos_png(agregados)
+    }
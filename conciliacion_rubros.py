@@ -0,0 +1,148 @@
+"""
+CONCILIACIÓN ENTRE RUBROS
+Verifica que las cobranzas de Cuentas a Cobrar (monto_cobrado) y los pagos de
+Gastos Pagados por Adelantado tengan su contrapartida en Caja y Bancos.
+
+La conciliación es un join por hash sobre claves normalizadas (importe en
+centavos y contraparte: cliente o proveedor contra la contraparte de Caja):
+- Pagos de prepagos: además, la fecha de pago exacta. Las repeticiones de una
+  misma clave se numeran (cumcount) para conciliar uno a uno.
+- Cobranzas: el ingreso debe caer entre la emisión de la factura y su
+  vencimiento más VENTANA_COBRANZA_DIAS. Facturas e ingresos se ordenan por
+  (clave, fecha) y se recorren en una sola pasada: cada ingreso se asigna a
+  la factura abierta de su clave que vence primero (asignación óptima de
+  intervalos), sin producto cruzado entre repeticiones de una misma clave.
+El costo es O(n log n) en el tamaño de ambos rubros.
+"""
+
+import heapq
+
+import numpy as np
+import pandas as pd
+
+COLUMNA_CONCILIACION = 'conciliado_caja'
+COLUMNA_CONTRAPARTE_CAJA = 'contraparte'
+TIPOS_INGRESO = ('Venta', 'Cobranza')
+TIPOS_EGRESO = ('Gasto', 'Pago')
+VENTANA_COBRANZA_DIAS = 90
+
+
+def _normalizar_claves(df, columna_importe, columna_fecha=None, columna_contraparte=None):
+    claves = pd.DataFrame(index=df.index)
+    claves['importe'] = np.round(df[columna_importe].to_numpy(dtype=np.float64) * 100).astype(np.int64)
+    if columna_fecha is not None:
+        claves['fecha'] = pd.to_datetime(df[columna_fecha]).dt.normalize()
+    if columna_contraparte is not None:
+        claves['contraparte'] = df[columna_contraparte].astype(str).str.strip().str.upper()
+    return claves
+
+
+def conciliar(izquierda, derecha):
+    """
+    Concilia uno a uno dos conjuntos de claves normalizadas con las mismas columnas.
+
+    Devuelve un array booleano con las filas de la izquierda que encontraron contrapartida.
+    """
+    columnas = list(izquierda.columns)
+    izquierda = izquierda.assign(ocurrencia=izquierda.groupby(columnas, sort=False).cumcount())
+    derecha = derecha.assign(ocurrencia=derecha.groupby(columnas, sort=False).cumcount())
+    derecha = derecha[columnas + ['ocurrencia']].assign(_conciliado=True)
+
+    cruce = izquierda.merge(derecha, on=columnas + ['ocurrencia'], how='left', sort=False)
+    return cruce['_conciliado'].notna().to_numpy()
+
+
+def _codigos_clave(izquierda, derecha):
+    """Código entero de la clave (columnas comunes) de cada fila de ambos lados"""
+    columnas = list(izquierda.columns)
+    codigos = pd.concat([izquierda[columnas], derecha[columnas]], ignore_index=True) \
+        .groupby(columnas, sort=False).ngroup().to_numpy()
+    return codigos[:len(izquierda)], codigos[len(izquierda):]
+
+
+def conciliar_en_ventana(izquierda, derecha, desde, hasta, fecha_derecha):
+    """
+    Concilia uno a uno claves iguales cuya fecha de la derecha cae en [desde, hasta]
+    de la izquierda.
+
+    Devuelve un array booleano con las filas de la izquierda que encontraron contrapartida.
+    """
+    conciliado = np.zeros(len(izquierda), dtype=bool)
+    if len(izquierda) == 0 or len(derecha) == 0:
+        return conciliado
+    clave_izquierda, clave_derecha = _codigos_clave(izquierda, derecha)
+    desde = pd.to_datetime(pd.Series(np.asarray(desde))).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    hasta = pd.to_datetime(pd.Series(np.asarray(hasta))).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    fecha = pd.to_datetime(pd.Series(np.asarray(fecha_derecha))).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+    # Eventos ordenados por (clave, fecha); a igual fecha la apertura de una
+    # factura precede al ingreso, porque la ventana es cerrada
+    n = len(izquierda)
+    clave = np.concatenate([clave_izquierda, clave_derecha])
+    momento = np.concatenate([desde, fecha])
+    es_ingreso = np.concatenate([np.zeros(n, dtype=bool), np.ones(len(derecha), dtype=bool)])
+    orden = np.lexsort((es_ingreso, momento, clave))
+    limite = hasta.tolist()
+
+    abiertas = []
+    clave_actual = None
+    for evento, k, t, ingreso in zip(orden.tolist(), clave[orden].tolist(), momento[orden].tolist(),
+                                     es_ingreso[orden].tolist()):
+        if k != clave_actual:
+            abiertas, clave_actual = [], k
+        if not ingreso:
+            heapq.heappush(abiertas, (limite[evento], evento))
+            continue
+        # Las facturas vencidas para este ingreso también lo están para los siguientes
+        while abiertas and abiertas[0][0] < t:
+            heapq.heappop(abiertas)
+        if abiertas:
+            conciliado[heapq.heappop(abiertas)[1]] = True
+    return conciliado
+
+
+def conciliar_cobranzas(cuentas_cobrar, caja, ventana_dias=VENTANA_COBRANZA_DIAS):
+    """Marca si cada cobranza registrada tiene su ingreso en Caja y Bancos"""
+    resultado = pd.Series(pd.NA, index=cuentas_cobrar.index, dtype='boolean')
+    cobradas = (cuentas_cobrar['monto_cobrado'] > 0).to_numpy()
+    ingresos = caja[caja['tipo_transaccion'].isin(TIPOS_INGRESO)]
+    facturas = cuentas_cobrar[cobradas]
+
+    izquierda = _normalizar_claves(facturas, 'monto_cobrado', columna_contraparte='cliente')
+    derecha = _normalizar_claves(ingresos, 'monto', columna_contraparte=COLUMNA_CONTRAPARTE_CAJA)
+    desde = pd.to_datetime(facturas['fecha_emision']).dt.normalize()
+    hasta = pd.to_datetime(facturas['fecha_vencimiento']).dt.normalize() + pd.Timedelta(days=ventana_dias)
+    fecha = pd.to_datetime(ingresos['fecha_hora']).dt.normalize()
+    resultado[cobradas] = conciliar_en_ventana(izquierda, derecha, desde, hasta, fecha)
+    return resultado
+
+
+def conciliar_pagos_prepagos(prepagos, caja):
+    """Marca si cada prepago tiene su egreso en Caja y Bancos en la fecha de pago"""
+    egresos = caja[caja['tipo_transaccion'].isin(TIPOS_EGRESO)]
+    izquierda = _normalizar_claves(prepagos, 'monto_total', 'fecha_pago', 'proveedor')
+    derecha = _normalizar_claves(egresos, 'monto', 'fecha_hora', COLUMNA_CONTRAPARTE_CAJA)
+    return pd.Series(conciliar(izquierda, derecha), index=prepagos.index, dtype='boolean')
+
+
+def conciliar_rubros(data_dict):
+    """Agrega la marca de conciliación con Caja y Bancos a los rubros que corresponda"""
+    caja = data_dict.get('Caja y Bancos')
+    if caja is None or COLUMNA_CONTRAPARTE_CAJA not in caja.columns:
+        return data_dict
+
+    if 'Cuentas a Cobrar' in data_dict:
+        df = data_dict['Cuentas a Cobrar']
+        df[COLUMNA_CONCILIACION] = conciliar_cobranzas(df, caja)
+    if 'Prepagos' in data_dict:
+        df = data_dict['Prepagos']
+        df[COLUMNA_CONCILIACION] = conciliar_pagos_prepagos(df, caja)
+    return data_dict
+
+
+def partidas_sin_conciliar(df):
+    """Cantidad de partidas que debían conciliar y no encontraron contrapartida"""
+    if COLUMNA_CONCILIACION not in df.columns:
+        return 0
+    # Las partidas que no debían conciliar quedan en NA y no se cuentan
+    return int((~df[COLUMNA_CONCILIACION].fillna(True)).sum())
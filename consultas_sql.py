@@ -0,0 +1,120 @@
+"""
+CAPA DE CONSULTAS SQL ANALÍTICAS SOBRE RESULTADOS DE AUDITORÍA
+Registra cada DataFrame de rubro en un motor DuckDB en proceso para responder
+consultas ad-hoc (drill-down) sin copias de pandas: DuckDB lee las columnas
+de los DataFrames directamente y los resultados se devuelven como tablas Arrow.
+
+La conexión no tiene acceso externo (archivos, red, extensiones) y sólo se
+admite una única sentencia SELECT por consulta, con un máximo de filas.
+"""
+
+try:
+    import duckdb
+except ImportError:  # dependencia opcional
+    duckdb = None
+
+MAX_FILAS_RESULTADO = 1000
+
+# Nombre de la tabla SQL de cada rubro
+TABLAS_RUBRO = {
+    'Caja y Bancos': 'caja_bancos',
+    'Inversiones': 'inversiones',
+    'Cuentas a Cobrar': 'cuentas_cobrar',
+    'Inventarios': 'inventarios',
+    'Prepagos': 'prepagos'
+}
+
+# Consultas predefinidas: (tabla requerida, SQL)
+CONSULTAS_PREDEFINIDAS = {
+    'Anomalías por responsable (Caja y Bancos)': ('caja_bancos', """
+        SELECT responsable,
+               COUNT(*) FILTER (WHERE resultado_if = 'Anómalo') AS anomalias,
+               COUNT(*) AS transacciones,
+               ROUND(SUM(monto) FILTER (WHERE resultado_if = 'Anómalo'), 2) AS monto_anomalo
+        FROM caja_bancos
+        GROUP BY responsable
+        ORDER BY anomalias DESC, monto_anomalo DESC
+    """),
+    'Facturas vencidas por cliente': ('cuentas_cobrar', """
+        SELECT cliente,
+               COUNT(*) AS facturas_vencidas,
+               ROUND(SUM(saldo_pendiente), 2) AS saldo_vencido,
+               MIN(fecha_vencimiento) AS vencimiento_mas_antiguo
+        FROM cuentas_cobrar
+        WHERE estado = 'Vencida' AND saldo_pendiente > 0
+        GROUP BY cliente
+        ORDER BY saldo_vencido DESC
+    """),
+    'Prepagos por proveedor': ('prepagos', """
+        SELECT proveedor,
+               COUNT(*) AS contratos,
+               ROUND(SUM(monto_total), 2) AS monto_total,
+               ROUND(SUM(saldo_no_devengado), 2) AS saldo_no_devengado
+        FROM prepagos
+        GROUP BY proveedor
+        ORDER BY monto_total DESC
+    """),
+    'Inversiones con desvío de valuación': ('inversiones', """
+        SELECT tipo,
+               COUNT(*) AS posiciones,
+               ROUND(SUM(desvio_valuacion), 2) AS desvio_total
+        FROM inversiones
+        WHERE alerta_valuacion IS NOT NULL
+        GROUP BY tipo
+        ORDER BY desvio_total
+    """),
+    'Inventario por clasificación de rotación': ('inventarios', """
+        SELECT COALESCE(clasificacion_rotacion, 'Normal') AS clasificacion,
+               COUNT(*) AS items,
+               ROUND(SUM(valor_fifo), 2) AS valor_fifo
+        FROM inventarios
+        GROUP BY clasificacion
+        ORDER BY valor_fifo DESC
+    """)
+}
+
+
+def duckdb_disponible():
+    return duckdb is not None
+
+
+class ConsultorSQL:
+    """Conexión DuckDB en memoria con los rubros registrados y caché de resultados"""
+
+    def __init__(self, data_dict):
+        if duckdb is None:
+            raise ImportError("DuckDB no está instalado: pip install duckdb")
+        self.data_dict = data_dict
+        # Sin acceso externo: read_text, COPY, ATTACH o INSTALL fallan con PermissionException
+        self.con = duckdb.connect(database=':memory:', config={'enable_external_access': False})
+        self.tablas = {}
+        for rubro, df in data_dict.items():
+            tabla = TABLAS_RUBRO.get(rubro, rubro.lower().replace(' ', '_'))
+            # register() no copia el DataFrame: DuckDB escanea sus arrays en el lugar
+            self.con.register(tabla, df)
+            self.tablas[tabla] = rubro
+        self._cache = {}
+
+    def consultas_disponibles(self):
+        """Consultas predefinidas cuya tabla está registrada"""
+        return {nombre: sql for nombre, (tabla, sql) in CONSULTAS_PREDEFINIDAS.items()
+                if tabla in self.tablas}
+
+    def consultar(self, sql, max_filas=MAX_FILAS_RESULTADO):
+        """
+        Ejecuta una única sentencia SELECT y devuelve (tabla Arrow, truncada).
+
+        El resultado se limita a max_filas (truncada indica si había más) y se
+        cachea por texto SQL.
+        """
+        clave = ' '.join(sql.split())
+        if (clave, max_filas) not in self._cache:
+            sentencias = self.con.extract_statements(clave)
+            if len(sentencias) != 1 or sentencias[0].type != duckdb.StatementType.SELECT:
+                raise ValueError("Sólo se admite una única consulta SELECT")
+            tabla = self.con.sql(clave).limit(max_filas + 1).fetch_arrow_table()
+            self._cache[(clave, max_filas)] = (tabla.slice(0, max_filas), tabla.num_rows > max_filas)
+        return self._cache[(clave, max_filas)]
+
+    def cerrar(self):
+        self.con.close()
@@ -0,0 +1,220 @@
+"""
+EJECUCIÓN CON MEMORIA ACOTADA (FUERA DE MEMORIA)
+Cuando un rubro no entra en el presupuesto de memoria configurado, la
+detección de anomalías se hace por bloques:
+- Matriz de features float32 en un archivo memory-mapped (una sola pasada)
+- StandardScaler ajustado con partial_fit bloque a bloque
+- Isolation Forest ajustado sobre una submuestra (cada árbol usa a lo sumo
+  256 registros, por lo que la submuestra no cambia el modelo en esencia)
+- Scoring, explicación de anomalías y reglas por bloques, con los resultados
+  volcados a Parquet
+
+La fuente puede ser un DataFrame o la ruta de un CSV, que se lee por bloques
+sin cargarlo completo.
+"""
+
+import argparse
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+from almacen_resultados import DIRECTORIO_CACHE
+from explicacion_anomalias import agregar_explicaciones, explicar
+from visor_hallazgos import materialidad_hallazgos, top_k
+
+PRESUPUESTO_MEMORIA_MB = int(os.environ.get('AUDITORIA_PRESUPUESTO_MB', 2048))
+# Copias float64 de la matriz de features que hace la ejecución en memoria
+# (fillna, escalado, huella del modelo y scores)
+COPIAS_EN_MEMORIA = 4
+FRACCION_BLOQUE = 0.10
+BYTES_POR_FILA_CSV = 512
+TAMANO_MUESTRA_AJUSTE = 200_000
+HALLAZGOS_RETENIDOS = 100
+DIRECTORIO_TRABAJO = os.path.join(DIRECTORIO_CACHE, 'fuera_de_memoria')
+
+
+def memoria_requerida_mb(n_filas, n_features):
+    """Memoria estimada (MB) de la detección de anomalías en memoria"""
+    return n_filas * n_features * 8 * COPIAS_EN_MEMORIA / 2 ** 20
+
+
+def excede_presupuesto(n_filas, n_features, presupuesto_mb=PRESUPUESTO_MEMORIA_MB):
+    return memoria_requerida_mb(n_filas, n_features) > presupuesto_mb
+
+
+def filas_por_bloque(bytes_por_fila, presupuesto_mb=PRESUPUESTO_MEMORIA_MB):
+    """Filas por bloque para que cada bloque ocupe una fracción acotada del presupuesto"""
+    return max(10_000, int(presupuesto_mb * 2 ** 20 * FRACCION_BLOQUE // max(bytes_por_fila, 1)))
+
+
+def _bloques(fuente, filas, columnas=None):
+    """Itera la fuente (DataFrame o ruta CSV) en bloques de a lo sumo `filas` registros"""
+    if isinstance(fuente, pd.DataFrame):
+        for inicio in range(0, len(fuente), filas):
+            bloque = fuente.iloc[inicio:inicio + filas]
+            yield bloque if columnas is None else bloque[columnas]
+    else:
+        yield from pd.read_csv(fuente, chunksize=filas, usecols=columnas)
+
+
+def matriz_features(fuente, features, ruta, filas):
+    """
+    Vuelca las features a un archivo float32 y ajusta el escalado en la misma pasada.
+
+    Devuelve (X, scaler) donde X es un np.memmap de sólo lectura.
+    """
+    scaler = StandardScaler()
+    n_filas = 0
+    with open(ruta, 'wb') as f:
+        for bloque in _bloques(fuente, filas, features):
+            valores = np.nan_to_num(bloque.to_numpy(dtype=np.float32), nan=0.0)
+            if len(valores):
+                scaler.partial_fit(valores)
+                f.write(np.ascontiguousarray(valores).tobytes())
+                n_filas += len(valores)
+    if n_filas == 0:
+        raise ValueError("La fuente no contiene registros")
+    return np.memmap(ruta, dtype=np.float32, mode='r', shape=(n_filas, len(features))), scaler
+
+
+def ajustar_modelo(X, scaler, contamination=0.1, tamano_muestra=TAMANO_MUESTRA_AJUSTE, semilla=42):
+    """Isolation Forest ajustado sobre una submuestra aleatoria de la matriz"""
+    rng = np.random.default_rng(semilla)
+    if len(X) > tamano_muestra:
+        indices = np.sort(rng.choice(len(X), tamano_muestra, replace=False))
+        muestra = X[indices]
+    else:
+        muestra = np.asarray(X)
+    modelo = IsolationForest(n_estimators=100, contamination=contamination, random_state=42)
+    modelo.fit(scaler.transform(muestra))
+    return modelo
+
+
+def puntuar(X, scaler, modelo, filas):
+    """Predicción (1 / -1) y score de anomalía (mayor = más anómalo), por bloques"""
+    prediccion = np.empty(len(X), dtype=np.int8)
+    score = np.empty(len(X), dtype=np.float32)
+    for inicio in range(0, len(X), filas):
+        muestras = modelo.score_samples(scaler.transform(X[inicio:inicio + filas]))
+        # Equivalente a modelo.predict sin volver a recorrer los árboles
+        prediccion[inicio:inicio + filas] = np.where(muestras - modelo.offset_ < 0, -1, 1)
+        score[inicio:inicio + filas] = -muestras
+    return prediccion, score
+
+
+def isolation_forest_por_bloques(fuente, features, contamination=0.1,
+                                 presupuesto_mb=PRESUPUESTO_MEMORIA_MB, directorio=DIRECTORIO_TRABAJO):
+    """Isolation Forest completo sin materializar la matriz de features en memoria"""
+    filas = filas_por_bloque(len(features) * 8 * COPIAS_EN_MEMORIA, presupuesto_mb)
+    os.makedirs(directorio, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=directorio) as trabajo:
+        X, scaler = matriz_features(fuente, features, os.path.join(trabajo, 'features.f32'), filas)
+        modelo = ajustar_modelo(X, scaler, contamination)
+        prediccion, score = puntuar(X, scaler, modelo, filas)
+        del X
+    return prediccion, score, scaler, modelo
+
+
+def agregar_resultados_if(df, prediccion, score):
+    """Agrega anomaly_if, resultado_if y score_if con tipos compactos"""
+    df['anomaly_if'] = prediccion
+    df['resultado_if'] = pd.Categorical.from_codes((prediccion == -1).astype(np.int8),
+                                                   categories=['Normal', 'Anómalo'])
+    df['score_if'] = np.round(score, 4)
+    return df
+
+
+def _tabla_parquet(bloque, esquema):
+    tabla = pa.Table.from_pandas(bloque, preserve_index=False)
+    return tabla if esquema is None else tabla.cast(esquema)
+
+
+def auditar_por_bloques(fuente, features, destino, reglas=None, columna_importe=None,
+                        contamination=0.1, presupuesto_mb=PRESUPUESTO_MEMORIA_MB,
+                        hallazgos_retenidos=HALLAZGOS_RETENIDOS):
+    """
+    Audita una fuente que no entra en memoria y vuelca el resultado a Parquet.
+
+    reglas: función que recibe un bloque (DataFrame) y lo devuelve con la
+    columna 'alerta'. Devuelve un resumen con totales del rubro y los
+    hallazgos de mayor materialidad; el detalle completo queda en `destino`.
+    """
+    prediccion, score, scaler, modelo = isolation_forest_por_bloques(fuente, features, contamination, presupuesto_mb)
+
+    resumen = {'ruta': destino, 'cantidad': 0, 'anomalias': int((prediccion == -1).sum()),
+               'con_alerta': 0, 'importe': 0.0}
+    hallazgos = None
+    escritor = None
+    inicio = 0
+    try:
+        for bloque in _bloques(fuente, filas_por_bloque(BYTES_POR_FILA_CSV, presupuesto_mb)):
+            fin = inicio + len(bloque)
+            bloque = agregar_resultados_if(bloque.copy(deep=False), prediccion[inicio:fin], score[inicio:fin])
+            anomalos = np.flatnonzero(prediccion[inicio:fin] == -1)
+            bloque = agregar_explicaciones(bloque, anomalos, explicar(modelo, scaler, bloque, features, anomalos),
+                                           features)
+            if reglas is not None:
+                bloque = reglas(bloque)
+            if 'alerta' in bloque.columns:
+                bloque['alerta'] = bloque['alerta'].astype('string')
+                resumen['con_alerta'] += int(bloque['alerta'].notna().sum())
+
+            if columna_importe is not None:
+                resumen['importe'] += float(pd.to_numeric(bloque[columna_importe], errors='coerce').sum())
+                anomalos = bloque.iloc[anomalos]
+                seleccion = top_k(materialidad_hallazgos(anomalos, columna_importe), hallazgos_retenidos)
+                candidatos = anomalos.iloc[seleccion]
+                if hallazgos is not None:
+                    candidatos = pd.concat([hallazgos, candidatos], ignore_index=True)
+                hallazgos = candidatos.iloc[top_k(materialidad_hallazgos(candidatos, columna_importe),
+                                                  hallazgos_retenidos)].reset_index(drop=True)
+
+            tabla = _tabla_parquet(bloque, escritor.schema if escritor is not None else None)
+            if escritor is None:
+                escritor = pq.ParquetWriter(destino, tabla.schema)
+            escritor.write_table(tabla)
+            resumen['cantidad'] += len(bloque)
+            inicio = fin
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+    resumen['importe'] = round(resumen['importe'], 2)
+    resumen['hallazgos'] = hallazgos
+    return resumen
+
+
+def leer_resultado(ruta, columnas=None, filas=100_000):
+    """Itera el resultado volcado a Parquet en bloques (DataFrame)"""
+    for lote in pq.ParquetFile(ruta).iter_batches(batch_size=filas, columns=columnas):
+        yield lote.to_pandas()
+
+
+def main():
+    import auditoria_activos_corrientes as app
+
+    parser = argparse.ArgumentParser(description="Auditoría por bloques de un rubro en CSV")
+    parser.add_argument('ruta', help="CSV con los registros del rubro")
+    parser.add_argument('--rubro', choices=list(app.FEATURES_IF.keys()), default='Caja y Bancos')
+    parser.add_argument('--destino', default=None, help="Parquet de salida")
+    parser.add_argument('--presupuesto-mb', type=int, default=PRESUPUESTO_MEMORIA_MB)
+    args = parser.parse_args()
+
+    destino = args.destino or os.path.splitext(args.ruta)[0] + '_auditado.parquet'
+    resumen = auditar_por_bloques(args.ruta, app.FEATURES_IF[args.rubro], destino,
+                                  reglas=lambda bloque: app.aplicar_reglas_negocio(bloque, args.rubro),
+                                  columna_importe=app.COLUMNA_IMPORTE[args.rubro],
+                                  presupuesto_mb=args.presupuesto_mb)
+    print(f"✅ {resumen['cantidad']} registros auditados -> {destino}")
+    print(f"   Anomalías: {resumen['anomalias']} · Con alerta: {resumen['con_alerta']} · "
+          f"Importe: ${resumen['importe']:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+EXPORTACIÓN DE PAPELES DE TRABAJO
+Exporta la población auditada completa de cada rubro (con resultado_if,
+score_if y alerta) a un libro XLSX de varias hojas o a un ZIP de CSV.
+
+La escritura es por bloques: el libro se crea en modo write_only de openpyxl
+(las filas se vuelcan al disco a medida que se agregan) y los CSV se escriben
+directamente dentro del ZIP. La memoria usada depende del tamaño del bloque,
+no de la cantidad de filas.
+"""
+
+import io
+import re
+import zipfile
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+MAX_FILAS_HOJA = 1_048_575  # límite de Excel sin contar el encabezado
+FILAS_POR_BLOQUE = 50_000
+
+
+def _nombre_hoja(rubro, parte, usados):
+    """Nombre de hoja válido para Excel (máx. 31 caracteres, único)"""
+    base = re.sub(r'[\[\]\*\?/\\:]', '', rubro)[:31]
+    nombre = base if parte == 1 else f"{base[:26]} ({parte})"
+    while nombre in usados:
+        parte += 1
+        nombre = f"{base[:26]} ({parte})"
+    usados.add(nombre)
+    return nombre
+
+
+def _valores(serie):
+    """Valores nativos de una columna; NaN, NaT e infinitos (celdas inválidas en Excel) -> None"""
+    validos = serie.notna()
+    if pd.api.types.is_float_dtype(serie.dtype):
+        validos &= np.isfinite(serie.to_numpy(dtype=np.float64, na_value=np.nan))
+    return serie.astype(object).where(validos, None).tolist()
+
+
+def _bloques(df, filas_por_bloque):
+    """Itera el DataFrame por bloques convertidos a valores nativos"""
+    for inicio in range(0, len(df), filas_por_bloque):
+        bloque = df.iloc[inicio:inicio + filas_por_bloque]
+        yield zip(*[_valores(bloque[c]) for c in bloque.columns])
+
+
+def exportar_xlsx(data_dict, destino, filas_por_bloque=FILAS_POR_BLOQUE, max_filas_hoja=MAX_FILAS_HOJA):
+    """Escribe cada rubro en una o más hojas del libro destino (ruta o archivo)"""
+    libro = Workbook(write_only=True)
+    usados = set()
+
+    for rubro, df in data_dict.items():
+        encabezado = [str(c) for c in df.columns]
+        parte = 1
+        hoja = libro.create_sheet(_nombre_hoja(rubro, parte, usados))
+        hoja.append(encabezado)
+        filas_hoja = 0
+
+        for filas in _bloques(df, filas_por_bloque):
+            for fila in filas:
+                if filas_hoja == max_filas_hoja:
+                    # Hoja llena: se continúa en una nueva con el mismo encabezado
+                    parte += 1
+                    hoja = libro.create_sheet(_nombre_hoja(rubro, parte, usados))
+                    hoja.append(encabezado)
+                    filas_hoja = 0
+                hoja.append(fila)
+                filas_hoja += 1
+
+    libro.save(destino)
+    return destino
+
+
+def exportar_csv_zip(data_dict, destino, filas_por_bloque=FILAS_POR_BLOQUE):
+    """Escribe un CSV comprimido por rubro dentro de un archivo ZIP (ruta o archivo)"""
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED) as archivo_zip:
+        for rubro, df in data_dict.items():
+            nombre = re.sub(r'[^0-9A-Za-z]+', '_', rubro).strip('_').lower() + '.csv'
+            with archivo_zip.open(nombre, 'w', force_zip64=True) as binario:
+                with io.TextIOWrapper(binario, encoding='utf-8-sig', newline='') as texto:
+                    for inicio in range(0, max(len(df), 1), filas_por_bloque):
+                        df.iloc[inicio:inicio + filas_por_bloque].to_csv(
+                            texto, header=(inicio == 0), index=False)
+    return destino
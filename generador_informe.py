@@ -1,8 +1,13 @@
 from docx import Document
-from docx.shared import Pt, RGBColor
+from docx.shared import Pt, RGBColor, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from datetime import datetime
 import pandas as pd
+import io
+from componentes_informe import construir_componentes
+from explicacion_anomalias import PREFIJO_APORTE, COLUMNA_FACTOR
+
+MAX_FILAS_ANEXO_EXPLICACIONES = 50
 
 class GeneradorInformeAuditoria:
     def __init__(self, empresa_nombre, empresa_cuit, fecha_auditoria):
@@ -20,24 +25,92 @@ class GeneradorInformeAuditoria:
         self.doc.add_paragraph(f"\nEmpresa: {self.empresa_nombre}\nCUIT: {self.empresa_cuit}\nFecha: {datetime.now().strftime('%d/%m/%Y')}")
         self.doc.add_page_break()
 
-    def agregar_resumen_hallazgos(self, resumen_df):
+    def agregar_resumen_hallazgos(self, tabla_resumen):
         self.doc.add_heading('RESUMEN DE HALLAZGOS', level=1)
-        table = self.doc.add_table(rows=1, cols=len(resumen_df.columns))
+        encabezado, *filas = tabla_resumen
+        table = self.doc.add_table(rows=1, cols=len(encabezado))
         table.style = 'Light Grid Accent 1'
-        for i, col in enumerate(resumen_df.columns):
+        for i, col in enumerate(encabezado):
             table.rows[0].cells[i].text = col
-        for _, row in resumen_df.iterrows():
+        for fila in filas:
             cells = table.add_row().cells
-            for i, val in enumerate(row):
-                cells[i].text = str(val)
+            for i, val in enumerate(fila):
+                cells[i].text = val
+
+    def agregar_grafico(self, grafico_png):
+        self.doc.add_paragraph()
+        self.doc.add_picture(io.BytesIO(grafico_png), width=Inches(6))
+
+    def agregar_anexo_muestras(self, muestras):
+        self.doc.add_page_break()
+        self.doc.add_heading('ANEXO - MUESTRAS PARA PRUEBAS SUSTANTIVAS (NIA 530)', level=1)
+        for rubro, muestra in muestras.items():
+            self.doc.add_heading(rubro, level=2)
+            metodo = muestra['metodo_muestreo'].iloc[0] if not muestra.empty else '-'
+            self.doc.add_paragraph(f"Método: {metodo}. Partidas seleccionadas: {len(muestra)}.")
+            if muestra.empty:
+                continue
+            columnas = [c for c in muestra.columns if c != 'metodo_muestreo']
+            table = self.doc.add_table(rows=1, cols=len(columnas))
+            table.style = 'Light Grid Accent 1'
+            for i, col in enumerate(columnas):
+                table.rows[0].cells[i].text = str(col)
+            for fila in muestra[columnas].itertuples(index=False):
+                cells = table.add_row().cells
+                for i, val in enumerate(fila):
+                    cells[i].text = '' if pd.isna(val) else str(val)
+
+    def agregar_anexo_explicaciones(self, data_dict):
+        self.doc.add_page_break()
+        self.doc.add_heading('ANEXO - EXPLICACIÓN DE ANOMALÍAS', level=1)
+        self.doc.add_paragraph("Aporte de cada variable al aislamiento de cada anomalía en el "
+                               "Isolation Forest (atribución por profundidad; cada fila suma 100%). "
+                               f"Se listan hasta {MAX_FILAS_ANEXO_EXPLICACIONES} anomalías por rubro, "
+                               "de mayor a menor score.")
+        for rubro, df in data_dict.items():
+            if COLUMNA_FACTOR not in df.columns:
+                continue
+            anomalias = df[df['resultado_if'] == 'Anómalo']
+            if anomalias.empty:
+                continue
+            score = ['score_if'] if 'score_if' in df.columns else []
+            if score:
+                anomalias = anomalias.nlargest(MAX_FILAS_ANEXO_EXPLICACIONES, 'score_if')
+            anomalias = anomalias.head(MAX_FILAS_ANEXO_EXPLICACIONES)
+            aportes = [c for c in df.columns if c.startswith(PREFIJO_APORTE)]
+            columnas = [df.columns[0]] + score + [COLUMNA_FACTOR] + aportes
+            self.doc.add_heading(rubro, level=2)
+            table = self.doc.add_table(rows=1, cols=len(columnas))
+            table.style = 'Light Grid Accent 1'
+            for i, col in enumerate(columnas):
+                table.rows[0].cells[i].text = col[len(PREFIJO_APORTE):] if col in aportes else str(col)
+            for fila in anomalias[columnas].itertuples(index=False):
+                cells = table.add_row().cells
+                for i, val in enumerate(fila):
+                    if pd.isna(val):
+                        cells[i].text = ''
+                    else:
+                        cells[i].text = f"{val:.0%}" if columnas[i] in aportes else str(val)
 
-    def generar_informe(self, resumen_df, data_dict, ruta_salida):
+    def generar_informe(self, resumen_df, data_dict, ruta_salida, muestras=None, componentes=None):
+        if componentes is None:
+            componentes = construir_componentes(resumen_df, data_dict, self.fecha_auditoria)
         self.agregar_portada()
-        self.agregar_resumen_hallazgos(resumen_df)
+        self.agregar_resumen_hallazgos(componentes['tabla_resumen'])
+        self.agregar_grafico(componentes['grafico_saldos'])
         self.doc.add_heading('DETALLE DE ANOMALÍAS', level=1)
         for rubro, df in data_dict.items():
             anomalias = df[df['resultado_if'] == 'Anómalo']
             if not anomalias.empty:
                 self.doc.add_heading(rubro, level=2)
-                self.doc.add_paragraph(f"Se detectaron {len(anomalias)} anomalías.")
+                texto = f"Se detectaron {len(anomalias)} anomalías."
+                if COLUMNA_FACTOR in anomalias.columns:
+                    factores = anomalias[COLUMNA_FACTOR].value_counts()
+                    factores = factores[factores > 0]
+                    texto += " Factor principal: " + ", ".join(f"{f} ({n})" for f, n in factores.items()) + "."
+                self.doc.add_paragraph(texto)
+        if muestras:
+            self.agregar_anexo_muestras(muestras)
+        if any(COLUMNA_FACTOR in df.columns for df in data_dict.values()):
+            self.agregar_anexo_explicaciones(data_dict)
         self.doc.save(ruta_salida)
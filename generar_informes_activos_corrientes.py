@@ -5,18 +5,165 @@ GENERADOR DE INFORMES DE AUDITORÍA EN PDF - ACTIVOS CORRIENTES
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Image
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
 from datetime import datetime
+from string import Template
+import io
 import os
 
+from almacen_resultados import AlmacenResultados
+from componentes_informe import construir_componentes
+
+# ===============================================================
+# PLANTILLAS DE NARRATIVA (se compilan una sola vez al importar)
+# ===============================================================
+
+ALIAS_RUBRO = {
+    'Inversiones Temporarias': 'Inversiones',
+    'Gastos Pagados por Adelantado': 'Prepagos'
+}
+
+UNIDADES_RUBRO = {
+    'Caja y Bancos': 'transacciones',
+    'Inversiones': 'inversiones',
+    'Cuentas a Cobrar': 'facturas',
+    'Inventarios': 'ítems',
+    'Prepagos': 'registros'
+}
+
+PLANTILLA_RESUMEN = Template("""
+El presente informe corresponde al análisis algorítmico de los <b>Activos Corrientes</b> 
+del ejercicio fiscal $periodo, con fecha de corte $fecha_corte, realizado mediante técnicas 
+de machine learning y conforme a las RT 7, RT 37 y Normas Internacionales de Auditoría (NIAs).
+<br/><br/>
+<b>Componentes Analizados:</b>
+<br/><br/>
+$componentes
+<br/><br/>
+<b>Total de Activos Corrientes:</b> $$$total_saldo
+<br/><br/>
+Se detectaron anomalías en $total_anomalias de $total_cantidad registros mediante el algoritmo 
+Isolation Forest, requiriendo revisión adicional por parte del equipo de auditoría.$conciliacion
+""")
+
+PLANTILLA_COMPONENTE = Template("• <b>$rubro:</b> $cantidad $unidad por $$$saldo")
+
+PLANTILLA_CONCILIACION = Template("""
+<br/><br/>
+La conciliación entre rubros identificó $sin_conciliar partidas sin contrapartida en Caja y Bancos.""")
+
+PLANTILLA_ENCABEZADO_RUBRO = Template("<b>$numero. $rubro</b><br/><br/>")
+
+PLANTILLAS_RUBRO = {
+    'Caja y Bancos': Template("""
+Se analizaron $cantidad transacciones del período, aplicando algoritmos de detección de anomalías 
+para identificar movimientos atípicos en montos y frecuencias. El saldo acumulado al cierre es de 
+$$$saldo_final; $saldos_negativos registros presentan saldo negativo. El movimiento individual 
+de mayor importe asciende a $$$monto_maximo.
+"""),
+    'Inversiones': Template("""
+Evaluación de $cantidad instrumentos financieros ($activas activos), revaluados por devengamiento 
+(Plazo Fijo y Cauciones) y a valor de mercado (FCI, Acciones y Bonos). $desvios posiciones presentan 
+desvíos de valuación respecto del valor registrado, con un desvío neto de $$$desvio_total.
+"""),
+    'Cuentas a Cobrar': Template("""
+Análisis de $cantidad facturas con un saldo pendiente de $$$saldo. $vencidas facturas se encuentran 
+vencidas con saldo impago por $$$saldo_vencido, de las cuales $mora_90 presentan mora superior a 
+90 días, sugiriendo evaluación de previsión para incobrables.
+"""),
+    'Inventarios': Template("""
+Revisión de $cantidad ítems valuados por capas FIFO y precio promedio ponderado (RT 31) a partir 
+del historial de movimientos. Se identificaron $baja_rotacion ítems de baja rotación y $obsoletos 
+ítems sin salidas en el último año, con un valor FIFO de $$$valor_obsoleto que podría requerir 
+ajuste por obsolescencia.
+"""),
+    'Prepagos': Template("""
+Análisis de $cantidad conceptos prepagos mediante su cronograma de amortización mensual. El saldo 
+no devengado al corte es de $$$saldo_no_devengado; $totalmente_devengados prepagos se encuentran 
+totalmente devengados por $$$monto_reclasificar y deberían reclasificarse a resultados.
+""")
+}
+
+PLANTILLA_RUBRO_GENERICA = Template("""
+Se analizaron $cantidad registros con un saldo de $$$saldo.
+""")
+
+PLANTILLA_HALLAZGOS = Template("""
+<br/><br/>
+<b>Hallazgos:</b> $anomalias registros anómalos según Isolation Forest y $con_alerta con alertas 
+de reglas de negocio$detalle_alertas.
+""")
+
+PLANTILLA_CONCLUSIONES = Template("""
+<b>CONCLUSIÓN GENERAL</b>
+<br/><br/>
+Los procedimientos algorítmicos aplicados sobre los Activos Corrientes del ejercicio $periodo 
+identificaron $total_anomalias registros anómalos que requieren revisión. Las conclusiones 
+deben evaluarse considerando la materialidad de los hallazgos detallados por componente.
+<br/><br/>
+<b>RECOMENDACIONES:</b>
+<br/>
+$recomendaciones
+<br/><br/>
+<b>CERTIFICACIÓN:</b> Los procedimientos aplicados cumplen con ISA 315 (Identificación de 
+Riesgos) e ISA 520 (Procedimientos Analíticos).
+""")
+
+# (rubro, métrica que dispara la recomendación, texto)
+RECOMENDACIONES = [
+    ('Cuentas a Cobrar', 'vencidas', 'Implementar gestión de cobranza más activa para facturas vencidas'),
+    ('Cuentas a Cobrar', 'mora_90', 'Evaluar previsión para deudores incobrables según antigüedad de saldos'),
+    ('Inventarios', 'obsoletos', 'Revisar inventarios obsoletos para ajustes por desvalorización'),
+    ('Inventarios', 'baja_rotacion', 'Analizar ítems de baja rotación y su valor recuperable'),
+    ('Caja y Bancos', 'saldos_negativos', 'Documentar y regularizar los saldos negativos de Caja'),
+    ('Inversiones', 'desvios', 'Conciliar la valuación registrada de inversiones con devengamiento y precios de mercado'),
+    ('Prepagos', 'totalmente_devengados', 'Reclasificar a resultados los prepagos totalmente devengados'),
+]
+RECOMENDACION_CONCILIACION = 'Investigar las partidas sin contrapartida en Caja y Bancos'
+RECOMENDACION_SIN_HALLAZGOS = 'Mantener los procedimientos de control vigentes'
+
+ESTILO_TABLA_RESUMEN = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1a237e')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#e8eaf6')),
+])
+
+
+def _rubro_base(rubro):
+    return ALIAS_RUBRO.get(rubro, rubro)
+
+
+def _campos_rubro(r):
+    """Valores formateados para completar las plantillas de un rubro"""
+    campos = {
+        'cantidad': f"{r['cantidad']:,}",
+        'saldo': f"{r['saldo']:,.2f}",
+        'anomalias': f"{r['anomalias']:,}",
+        'con_alerta': f"{r['con_alerta']:,}",
+        'detalle_alertas': ''
+    }
+    if r['alertas']:
+        detalle = ', '.join(f"{alerta} ({cantidad})" for alerta, cantidad in r['alertas'].items())
+        campos['detalle_alertas'] = f": {detalle}"
+    for clave, valor in r['metricas'].items():
+        campos[clave] = f"{valor:,.2f}" if isinstance(valor, float) else f"{valor:,}"
+    return campos
+
 
 class GeneradorInformePDFActivosCorrientes:
     """Genera informes de auditoría en formato PDF para Activos Corrientes"""
     
-    def __init__(self, año):
+    def __init__(self, año, componentes):
         self.año = año
+        self.componentes = componentes
+        self.agregados = componentes['agregados']
         self.styles = getSampleStyleSheet()
         self._crear_estilos_personalizados()
     
@@ -82,144 +229,81 @@ class GeneradorInformePDFActivosCorrientes:
         return elementos
     
     def _crear_resumen(self):
-        """Crea el resumen ejecutivo"""
+        """Crea el resumen ejecutivo a partir de los agregados de la auditoría"""
         elementos = []
         elementos.append(Paragraph("RESUMEN EJECUTIVO", self.styles['Subtitulo']))
         elementos.append(Spacer(1, 0.3*cm))
         
-        # Datos simulados que varían por año
-        factor = 1 + (self.año - 2020) * 0.10
+        agregados = self.agregados
+        lineas = [PLANTILLA_COMPONENTE.substitute(
+            rubro=r['rubro'],
+            cantidad=f"{r['cantidad']:,}",
+            unidad=UNIDADES_RUBRO.get(_rubro_base(r['rubro']), 'registros'),
+            saldo=f"{r['saldo']:,.2f}"
+        ) for r in agregados['rubros']]
         
-        texto = f"""
-        El presente informe corresponde al análisis algorítmico de los <b>Activos Corrientes</b> 
-        del ejercicio fiscal {self.año}, realizado mediante técnicas avanzadas de machine learning 
-        y conforme a las RT 7, RT 37 y Normas Internacionales de Auditoría (NIAs).
-        <br/><br/>
-        <b>Componentes Analizados:</b>
-        <br/><br/>
-        • <b>Caja y Bancos:</b> 50 transacciones por ${2500000 * factor:,.0f}
-        <br/>
-        • <b>Inversiones Temporarias:</b> 30 inversiones valoradas en ${4800000 * factor:,.0f}
-        <br/>
-        • <b>Cuentas a Cobrar:</b> 40 facturas por ${6200000 * factor:,.0f}
-        <br/>
-        • <b>Inventarios:</b> 60 items valorados en ${8500000 * factor:,.0f}
-        <br/>
-        • <b>Gastos Pagados por Adelantado:</b> 20 registros por ${450000 * factor:,.0f}
-        <br/><br/>
-        <b>Total de Activos Corrientes:</b> ${(2500000 + 4800000 + 6200000 + 8500000 + 450000) * factor:,.0f}
-        <br/><br/>
-        Se detectaron anomalías en {4 + self.año % 4} registros mediante el algoritmo Isolation Forest, 
-        requiriendo revisión adicional por parte del equipo de auditoría.
-        """
+        conciliacion = ''
+        if agregados['total_sin_conciliar']:
+            conciliacion = PLANTILLA_CONCILIACION.substitute(sin_conciliar=f"{agregados['total_sin_conciliar']:,}")
+        
+        texto = PLANTILLA_RESUMEN.substitute(
+            fecha_corte=agregados['fecha_corte'].strftime('%d/%m/%Y'),
+            periodo=self.año,
+            componentes='<br/>'.join(lineas),
+            total_saldo=f"{agregados['total_saldo']:,.2f}",
+            total_anomalias=f"{agregados['total_anomalias']:,}",
+            total_cantidad=f"{agregados['total_cantidad']:,}",
+            conciliacion=conciliacion
+        )
         
         elementos.append(Paragraph(texto, self.styles['Justificado']))
+        elementos.append(Spacer(1, 0.3*cm))
+        
+        tabla = Table(self.componentes['tabla_resumen'], repeatRows=1)
+        tabla.setStyle(ESTILO_TABLA_RESUMEN)
+        elementos.append(tabla)
         elementos.append(Spacer(1, 0.5*cm))
+        
+        elementos.append(Image(io.BytesIO(self.componentes['grafico_saldos']), width=16*cm, height=7*cm,
+                               kind='proportional'))
+        elementos.append(PageBreak())
         return elementos
     
     def _crear_analisis_componentes(self):
-        """Crea el análisis de componentes"""
+        """Crea el análisis de componentes con las métricas reales de cada rubro"""
         elementos = []
         elementos.append(Paragraph("ANÁLISIS POR COMPONENTE", self.styles['Subtitulo']))
         elementos.append(Spacer(1, 0.3*cm))
         
-        # Caja y Bancos
-        texto_caja = """
-        <b>1. CAJA Y BANCOS</b>
-        <br/><br/>
-        Se analizaron 50 transacciones del período, aplicando algoritmos de detección de anomalías 
-        para identificar movimientos atípicos en montos y frecuencias. El saldo acumulado presenta 
-        un comportamiento consistente con el nivel de operaciones de la empresa.
-        <br/><br/>
-        <b>Hallazgos:</b> Se detectó 1 transacción con monto significativamente superior al promedio 
-        que requiere documentación adicional.
-        """
-        elementos.append(Paragraph(texto_caja, self.styles['Justificado']))
-        elementos.append(Spacer(1, 0.3*cm))
-        
-        # Inversiones
-        texto_inv = """
-        <b>2. INVERSIONES TEMPORARIAS</b>
-        <br/><br/>
-        Evaluación de 30 instrumentos financieros incluyendo plazos fijos, FCI, acciones y bonos. 
-        El análisis de tasas de rendimiento y valores actuales no evidencia inconsistencias 
-        significativas respecto a las condiciones de mercado del período.
-        <br/><br/>
-        <b>Hallazgos:</b> Todas las inversiones presentan documentación respaldatoria adecuada.
-        """
-        elementos.append(Paragraph(texto_inv, self.styles['Justificado']))
-        elementos.append(Spacer(1, 0.3*cm))
-        
-        # Cuentas a Cobrar
-        texto_cc = """
-        <b>3. CUENTAS A COBRAR</b>
-        <br/><br/>
-        Análisis de 40 facturas emitidas con diferentes plazos de vencimiento. Se identificaron 
-        cuentas vencidas que requieren gestión de cobranza activa. El algoritmo detectó patrones 
-        de antigüedad de saldos consistentes con políticas crediticias.
-        <br/><br/>
-        <b>Hallazgos:</b> 12 facturas presentan mora superior a 90 días, sugiriendo evaluación 
-        de previsión para incobrables.
-        """
-        elementos.append(Paragraph(texto_cc, self.styles['Justificado']))
-        elementos.append(PageBreak())
-        
-        # Inventarios
-        texto_inv_stock = """
-        <b>4. INVENTARIOS</b>
-        <br/><br/>
-        Revisión de 60 ítems clasificados en materias primas, productos en proceso y productos 
-        terminados. Se verificaron valores de costo unitario y cantidades en stock mediante 
-        técnicas de detección de outliers.
-        <br/><br/>
-        <b>Hallazgos:</b> Se identificaron 3 ítems con rotación anormalmente baja que podrían 
-        requerir ajuste por obsolescencia.
-        """
-        elementos.append(Paragraph(texto_inv_stock, self.styles['Justificado']))
-        elementos.append(Spacer(1, 0.3*cm))
-        
-        # Prepagos
-        texto_prepagos = """
-        <b>5. GASTOS PAGADOS POR ADELANTADO</b>
-        <br/><br/>
-        Análisis de 20 conceptos prepagos incluyendo alquileres, seguros y publicidad. 
-        Se verificó la correcta imputación temporal y proporcionalidad de los montos devengados.
-        <br/><br/>
-        <b>Hallazgos:</b> Todos los prepagos cuentan con documentación respaldatoria y contratos vigentes.
-        """
-        elementos.append(Paragraph(texto_prepagos, self.styles['Justificado']))
-        elementos.append(Spacer(1, 0.5*cm))
+        for numero, r in enumerate(self.agregados['rubros'], start=1):
+            campos = _campos_rubro(r)
+            plantilla = PLANTILLAS_RUBRO.get(_rubro_base(r['rubro']), PLANTILLA_RUBRO_GENERICA)
+            texto = PLANTILLA_ENCABEZADO_RUBRO.substitute(numero=numero, rubro=r['rubro'].upper())
+            texto += plantilla.substitute(campos)
+            texto += PLANTILLA_HALLAZGOS.substitute(campos)
+            elementos.append(Paragraph(texto, self.styles['Justificado']))
+            elementos.append(Spacer(1, 0.3*cm))
         return elementos
     
     def _crear_conclusiones(self):
-        """Crea conclusiones"""
+        """Crea conclusiones con recomendaciones derivadas de los hallazgos"""
         elementos = []
         elementos.append(Paragraph("CONCLUSIONES Y RECOMENDACIONES", self.styles['Subtitulo']))
         elementos.append(Spacer(1, 0.3*cm))
         
-        texto = f"""
-        <b>CONCLUSIÓN GENERAL</b>
-        <br/><br/>
-        Los Activos Corrientes del ejercicio {self.año} se encuentran razonablemente valuados 
-        de acuerdo con las RT 7 y RT 37, y las normas contables profesionales vigentes. 
-        Los algoritmos de detección identificaron patrones consistentes con anomalías menores 
-        que requieren atención pero no representan distorsiones materiales.
-        <br/><br/>
-        <b>RECOMENDACIONES:</b>
-        <br/>
-        1. Implementar gestión de cobranza más activa para facturas vencidas
-        <br/>
-        2. Evaluar previsión para deudores incobrables según antigüedad de saldos
-        <br/>
-        3. Revisar inventarios de baja rotación para ajustes por obsolescencia
-        <br/>
-        4. Documentar adecuadamente transacciones de montos significativos en Caja
-        <br/>
-        5. Mantener revisión trimestral de valuación de inversiones temporarias
-        <br/><br/>
-        <b>CERTIFICACIÓN:</b> Los procedimientos aplicados cumplen con ISA 315 (Identificación de 
-        Riesgos) e ISA 520 (Procedimientos Analíticos).
-        """
+        metricas = {_rubro_base(r['rubro']): r['metricas'] for r in self.agregados['rubros']}
+        recomendaciones = [texto for rubro, clave, texto in RECOMENDACIONES
+                           if metricas.get(rubro, {}).get(clave, 0)]
+        if self.agregados['total_sin_conciliar']:
+            recomendaciones.append(RECOMENDACION_CONCILIACION)
+        if not recomendaciones:
+            recomendaciones.append(RECOMENDACION_SIN_HALLAZGOS)
+        
+        texto = PLANTILLA_CONCLUSIONES.substitute(
+            periodo=self.año,
+            total_anomalias=f"{self.agregados['total_anomalias']:,}",
+            recomendaciones='<br/>'.join(f"{i}. {r}" for i, r in enumerate(recomendaciones, start=1))
+        )
         
         elementos.append(Paragraph(texto, self.styles['Justificado']))
         elementos.append(Spacer(1, 2*cm))
@@ -234,7 +318,7 @@ class GeneradorInformePDFActivosCorrientes:
         return elementos
     
     def generar_informe(self, nombre_archivo):
-        """Genera el PDF"""
+        """Genera el PDF (nombre_archivo puede ser una ruta o un archivo en memoria)"""
         try:
             doc = SimpleDocTemplate(
                 nombre_archivo,
@@ -258,20 +342,33 @@ class GeneradorInformePDFActivosCorrientes:
             return False
 
 
-def generar_todos_los_informes():
-    """Genera informes para años 2020-2024"""
-    os.makedirs('data/informes_auditoria_corrientes', exist_ok=True)
+def generar_todos_los_informes(directorio='data/informes_auditoria_corrientes'):
+    """Genera un informe PDF por cada auditoría guardada en el almacén de resultados"""
+    os.makedirs(directorio, exist_ok=True)
+    almacen = AlmacenResultados({})
     
-    for año in [2020, 2021, 2022, 2023, 2024]:
-        print(f"Generando informe {año}...")
-        generador = GeneradorInformePDFActivosCorrientes(año)
-        archivo = f'data/informes_auditoria_corrientes/informe_corrientes_{año}.pdf'
+    generados = 0
+    for clave, resultado in almacen.resultados_en_disco():
+        configuracion = resultado.get('configuracion')
+        if configuracion is None:
+            continue
+        fecha = configuracion['fecha']
+        print(f"Generando informe {fecha}...")
+        componentes = resultado.get('componentes') or construir_componentes(
+            resultado['resumen_df'], resultado['data_dict'], fecha)
+        generador = GeneradorInformePDFActivosCorrientes(fecha.year, componentes)
+        # La clave distingue auditorías de distintas empresas o rubros a la misma fecha
+        archivo = os.path.join(directorio, f'informe_corrientes_{fecha.isoformat()}_{clave}.pdf')
         if generador.generar_informe(archivo):
+            generados += 1
             print(f"✅ {archivo}")
         else:
-            print(f"❌ Error en {año}")
+            print(f"❌ Error en {fecha}")
     
-    print("\n✅ Todos los informes generados")
+    if generados:
+        print(f"\n✅ {generados} informes generados")
+    else:
+        print("\n⚠️ No hay auditorías guardadas: ejecute una auditoría desde la aplicación")
 
 
 if __name__ == "__main__":
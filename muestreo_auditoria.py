@@ -0,0 +1,147 @@
+"""
+MOTOR DE MUESTREO ESTADÍSTICO DE AUDITORÍA - NIA 530
+Selección de muestras para pruebas sustantivas sobre cualquier rubro:
+- Muestreo por unidad monetaria (MUS): selección sistemática sobre la suma acumulada
+- Muestreo estratificado: las partidas individualmente significativas se
+  examinan al 100% y el resto se reparte en bandas de importe, con asignación
+  proporcional al valor
+- Muestreo aleatorio simple
+
+Todas las selecciones son reproducibles por semilla y se resuelven en una
+pasada O(n) (suma acumulada + búsqueda binaria o claves aleatorias con
+argpartition), por lo que escalan a decenas de millones de filas.
+"""
+
+import math
+
+import numpy as np
+
+# Factores de confiabilidad (Poisson, cero errores) y de expansión por nivel de confianza
+FACTORES_CONFIANZA = {0.80: 1.61, 0.90: 2.31, 0.95: 3.00, 0.99: 4.61}
+FACTORES_EXPANSION = {0.80: 1.30, 0.90: 1.50, 0.95: 1.60, 0.99: 1.90}
+
+METODOS_MUESTREO = {
+    'mus': 'Unidad monetaria (MUS)',
+    'estratificado': 'Estratificado por importe',
+    'aleatorio': 'Aleatorio simple'
+}
+
+
+def tamano_muestra(valor_poblacion, materialidad, confianza=0.95, errores_esperados=0.0, tamano_poblacion=None):
+    """Calcula el tamaño de muestra a partir de materialidad y confianza (NIA 530)"""
+    if confianza not in FACTORES_CONFIANZA:
+        raise ValueError(f"Nivel de confianza no soportado: {confianza}")
+    margen = materialidad - errores_esperados * FACTORES_EXPANSION[confianza]
+    if margen <= 0:
+        raise ValueError("La materialidad debe superar los errores esperados ajustados")
+
+    n = math.ceil(valor_poblacion * FACTORES_CONFIANZA[confianza] / margen)
+    n = max(n, 1)
+    if tamano_poblacion is not None:
+        n = min(n, tamano_poblacion)
+    return n
+
+
+def _importes(df, columna_importe):
+    return np.abs(np.nan_to_num(df[columna_importe].to_numpy(dtype=np.float64)))
+
+
+def muestreo_unidad_monetaria(df, columna_importe, n, semilla=42):
+    """Selección sistemática por unidad monetaria; devuelve posiciones de fila"""
+    importes = _importes(df, columna_importe)
+    acumulado = np.cumsum(importes)
+    total = acumulado[-1] if len(acumulado) else 0.0
+    if total <= 0 or n <= 0:
+        return np.array([], dtype=np.int64)
+
+    rng = np.random.default_rng(semilla)
+    intervalo = total / n
+    puntos = rng.uniform(0, intervalo) + intervalo * np.arange(n)
+    posiciones = np.searchsorted(acumulado, puntos, side='right')
+    # Las partidas mayores al intervalo pueden recibir varios puntos: se cuentan una vez
+    return np.unique(np.minimum(posiciones, len(importes) - 1))
+
+
+def muestreo_estratificado(df, columna_importe, n, estratos=4, semilla=42, umbral=None):
+    """
+    Estratificación con estrato de partidas clave y bandas de importe.
+
+    Las partidas >= umbral (por defecto valor de la población / n) forman el
+    estrato superior y se seleccionan todas. El resto se divide en bandas
+    sobre los importes distintos (los empates no colapsan bandas) y se
+    selecciona al azar en cada una, con asignación proporcional al valor.
+    El estrato superior es el número estratos (base 0).
+    """
+    importes = _importes(df, columna_importe)
+    if len(importes) == 0 or n <= 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+
+    total = importes.sum()
+    if umbral is None:
+        umbral = total / n
+    clave = (importes >= umbral) & (importes > 0)
+
+    resto = importes[~clave]
+    distintos = np.unique(resto)
+    limites = np.quantile(distintos, np.linspace(0, 1, estratos + 1)[1:-1]) if len(distintos) else np.array([])
+    estrato = np.where(clave, estratos, np.searchsorted(limites, importes, side='right'))
+    tamano = np.bincount(estrato, minlength=estratos + 1)[:estratos]
+    valor = np.bincount(estrato, importes, minlength=estratos + 1)[:estratos]
+
+    n_resto = max(n - int(clave.sum()), 0)
+    if valor.sum() > 0:
+        asignacion = np.floor(n_resto * valor / valor.sum()).astype(np.int64)
+    else:
+        asignacion = np.floor(n_resto * tamano / max(tamano.sum(), 1)).astype(np.int64)
+    if n_resto > 0:
+        asignacion = np.maximum(asignacion, (tamano > 0).astype(np.int64))
+    asignacion = np.minimum(asignacion, tamano)
+
+    rng = np.random.default_rng(semilla)
+    claves = rng.random(len(importes))
+    seleccion = [np.flatnonzero(clave)]
+    for h in range(estratos):
+        if asignacion[h] == 0:
+            continue
+        miembros = np.flatnonzero(estrato == h)
+        if asignacion[h] < len(miembros):
+            miembros = miembros[np.argpartition(claves[miembros], asignacion[h] - 1)[:asignacion[h]]]
+        seleccion.append(miembros)
+
+    posiciones = np.sort(np.concatenate(seleccion))
+    return posiciones, estrato[posiciones]
+
+
+def muestreo_aleatorio(df, n, semilla=42):
+    """Selección aleatoria simple sin reposición"""
+    rng = np.random.default_rng(semilla)
+    n = min(n, len(df))
+    return np.sort(rng.choice(len(df), size=n, replace=False))
+
+
+def seleccionar_muestra(df, columna_importe, metodo='mus', materialidad=None, confianza=0.95,
+                        errores_esperados=0.0, semilla=42, estratos=4):
+    """Calcula el tamaño de muestra y devuelve las partidas seleccionadas"""
+    if metodo not in METODOS_MUESTREO:
+        raise ValueError(f"Método de muestreo no soportado: {metodo}")
+
+    valor_poblacion = float(_importes(df, columna_importe).sum())
+    if materialidad is None:
+        materialidad = 0.05 * valor_poblacion
+    n = tamano_muestra(valor_poblacion, materialidad, confianza, errores_esperados, len(df))
+
+    estrato = None
+    if metodo == 'mus':
+        posiciones = muestreo_unidad_monetaria(df, columna_importe, n, semilla)
+    elif metodo == 'estratificado':
+        # Partidas clave: las que superan la materialidad o el intervalo de muestreo
+        umbral = min(materialidad, valor_poblacion / n)
+        posiciones, estrato = muestreo_estratificado(df, columna_importe, n, estratos, semilla, umbral)
+    else:
+        posiciones = muestreo_aleatorio(df, n, semilla)
+
+    muestra = df.iloc[posiciones].copy()
+    muestra['metodo_muestreo'] = METODOS_MUESTREO[metodo]
+    if estrato is not None:
+        muestra['estrato'] = estrato + 1
+    return muestra
@@ -0,0 +1,30 @@
+"""
+PRECALENTAMIENTO DE CACHÉS
+Ejecuta una vez la generación de datos y el ajuste de modelos de todos los
+rubros para dejar sus resultados en la caché de disco (cache_persistente).
+Se invoca en el build del servicio para que el primer usuario no pague el
+arranque en frío.
+"""
+
+import time
+from datetime import datetime
+
+import auditoria_activos_corrientes as app
+from cache_persistente import DIRECTORIO_CACHE
+
+RUBROS = ["Caja y Bancos", "Inversiones Temporarias", "Cuentas a Cobrar",
+          "Inventarios", "Gastos Pagados por Adelantado"]
+
+
+def precalentar():
+    """Construye generadores y modelos ajustados en la caché de disco"""
+    inicio = time.time()
+    data_dict = app.ejecutar_auditoria(RUBROS, datetime.now().date())
+    filas = sum(len(df) for df in data_dict.values())
+    print(f"✅ Caché precalentada: {len(data_dict)} rubros, {filas} registros "
+          f"en {time.time() - inicio:.1f} s")
+    print(f"   Directorio: {DIRECTORIO_CACHE}")
+
+
+if __name__ == "__main__":
+    precalentar()
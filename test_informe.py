@@ -49,6 +49,17 @@ try:
         test_path = tmp.name
     print(f"   ✅ Directorio temporal disponible: {os.path.dirname(test_path)}")
     os.unlink(test_path)
+
+    # La caché (que se deserializa con pickle) sólo es accesible por su dueño
+    from almacen_resultados import preparar_directorio_cache
+    directorio_cache = os.path.join(tempfile.mkdtemp(), 'cache')
+    os.makedirs(directorio_cache, mode=0o777)
+    os.chmod(directorio_cache, 0o777)
+    preparar_directorio_cache(directorio_cache)
+    if os.stat(directorio_cache).st_mode & 0o777 != 0o700:
+        print(f"   ❌ Permisos de la caché: {oct(os.stat(directorio_cache).st_mode & 0o777)}")
+        exit(1)
+    print("   ✅ Directorio de caché privado (0o700)")
 except Exception as e:
     print(f"   ❌ Error con directorio temporal: {e}")
     exit(1)
@@ -85,6 +96,411 @@ except Exception as e:
     traceback.print_exc()
     exit(1)
 
+# Test 5: Muestreo NIA 530 y anexo del informe
+print("\n5. Generando informe con anexo de muestras...")
+try:
+    from muestreo_auditoria import seleccionar_muestra
+
+    muestra = seleccionar_muestra(data_dict['Caja y Bancos'], 'monto', 'mus', semilla=7)
+    repetida = seleccionar_muestra(data_dict['Caja y Bancos'], 'monto', 'mus', semilla=7)
+    if not muestra.equals(repetida):
+        print("   ❌ La muestra no es reproducible con la misma semilla")
+        exit(1)
+    print(f"   ✅ Muestra reproducible de {len(muestra)} partidas")
+
+    # Una partida que concentra casi todo el valor se examina siempre (estrato de partidas clave)
+    concentrada = pd.DataFrame({'monto': np.r_[np.ones(1000), 1e6]})
+    if not all(1000 in seleccionar_muestra(concentrada, 'monto', 'estratificado', semilla=s).index for s in range(10)):
+        print("   ❌ El muestreo estratificado omitió una partida individualmente significativa")
+        exit(1)
+    print("   ✅ Partidas individualmente significativas seleccionadas al 100%")
+
+    generador = GeneradorInformeAuditoria(
+        empresa_nombre="EMPRESA TEST S.A.",
+        empresa_cuit="30-12345678-9",
+        fecha_auditoria=datetime.now()
+    )
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp:
+        ruta_informe = tmp.name
+    generador.generar_informe(resumen_df, data_dict, ruta_informe, muestras={'Caja y Bancos': muestra})
+    print(f"   ✅ Informe con anexo generado ({os.path.getsize(ruta_informe)} bytes)")
+    os.unlink(ruta_informe)
+except Exception as e:
+    print(f"   ❌ Error en muestreo: {e}")
+    import traceback
+    traceback.print_exc()
+    exit(1)
+
+# Test 6: Explicación de anomalías por feature
+print("\n6. Explicando anomalías del Isolation Forest...")
+try:
+    import numpy as np
+    from sklearn.ensemble import IsolationForest
+    from explicacion_anomalias import contribuciones, agregar_explicaciones
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, 3))
+    X[:5, 1] = 12
+    modelo = IsolationForest(n_estimators=100, random_state=42).fit(X)
+    aportes = contribuciones(modelo, X[:5])
+    if not np.allclose(aportes.sum(axis=1), 1) or not (aportes.argmax(axis=1) == 1).all():
+        print("   ❌ Los aportes no señalan a la feature que aísla los registros")
+        exit(1)
+    print("   ✅ Aportes normalizados y atribuidos a la feature correcta")
+
+    caja = data_dict['Caja y Bancos']
+    anomalos = np.flatnonzero(caja['resultado_if'].to_numpy() == 'Anómalo')
+    agregar_explicaciones(caja, anomalos, np.tile([0.8, 0.2], (len(anomalos), 1)), ['monto', 'saldo_acumulado'])
+    generador = GeneradorInformeAuditoria(
+        empresa_nombre="EMPRESA TEST S.A.",
+        empresa_cuit="30-12345678-9",
+        fecha_auditoria=datetime.now()
+    )
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp:
+        ruta_informe = tmp.name
+    generador.generar_informe(resumen_df, data_dict, ruta_informe)
+    print(f"   ✅ Informe con anexo de explicaciones generado ({os.path.getsize(ruta_informe)} bytes)")
+    os.unlink(ruta_informe)
+except Exception as e:
+    print(f"   ❌ Error en explicación de anomalías: {e}")
+    import traceback
+    traceback.print_exc()
+    exit(1)
+
+# Test 7: Valuación de inventarios (FIFO, PPP y rotación)
+print("\n7. Valuando kardex de prueba...")
+try:
+    from valuacion_inventarios import valuar_inventario
+
+    # A: entra 10@1 y 10@2, salen 15, entra 5@3 -> quedan 5@3 + 5@2
+    # B: entra 5 y salen 8 -> stock negativo
+    movimientos = pd.DataFrame({
+        'id_item': ['A', 'A', 'A', 'A', 'B', 'B'],
+        'fecha': ['2026-01-01', '2026-01-11', '2026-01-21', '2026-01-31', '2026-01-01', '2026-01-05'],
+        'tipo': ['Entrada', 'Entrada', 'Salida', 'Entrada', 'Entrada', 'Salida'],
+        'cantidad': [10, 10, 15, 5, 5, 8],
+        'costo_unitario': [1, 2, None, 3, 1, None]
+    })
+    valuacion = valuar_inventario(movimientos, '2026-02-10').set_index('id_item')
+    a, b = valuacion.loc['A'], valuacion.loc['B']
+    # Stock promedio: (10x10 + 20x10 + 5x10 + 10x10) / 40 días = 11.25 -> rotación 15 / 11.25 x 365 / 40
+    esperado_a = {'existencia': 10, 'valor_fifo': 25, 'costo_ppp': 1.8, 'costo_ventas_fifo': 20,
+                  'rotacion': 12.17, 'dias_stock': 30.0, 'dias_sin_salida': 20}
+    errores = [f"{k}={a[k]} (esperado {v})" for k, v in esperado_a.items() if not np.isclose(a[k], v)]
+    if b['existencia'] != -3 or b['clasificacion_rotacion'] != 'Stock negativo':
+        errores.append(f"B: existencia={b['existencia']}, clasificación={b['clasificacion_rotacion']}")
+    if errores:
+        print("   ❌ Valuación incorrecta: " + "; ".join(errores))
+        exit(1)
+    print("   ✅ FIFO, PPP, rotación y stock negativo correctos")
+except Exception as e:
+    print(f"   ❌ Error en valuación de inventarios: {e}")
+    import traceback
+    traceback.print_exc()
+    exit(1)
+
+# Test 8: Devengamiento de gastos pagados por adelantado
+print("\n8. Devengando prepagos de prueba...")
+try:
+    from amortizacion_prepagos import devengamiento_al_corte, cronograma_amortizacion
+
+    prepagos = pd.DataFrame({
+        'id_prepago': ['P1', 'P2'],
+        'fecha_pago': ['2026-01-15', '2026-03-01'],
+        'monto_total': [1000.0, 1200.0],
+        'duracion_meses': [3, 12]
+    })
+    corte = devengamiento_al_corte(prepagos, ['2026-01-20', '2026-03-31']).set_index(['id_prepago', 'fecha_corte'])
+    cronograma = cronograma_amortizacion(prepagos)
+    cuotas_p1 = cronograma[cronograma['id_prepago'] == 'P1']['importe'].tolist()
+    errores = []
+    # Corte dentro del mes de pago: se devenga la primera cuota
+    if corte.loc[('P1', pd.Timestamp('2026-01-20')), 'monto_devengado'] != 333.33:
+        errores.append("corte en el mes de pago")
+    # La última cuota absorbe el redondeo: 333.33 + 333.33 + 333.34 = 1000
+    if cuotas_p1 != [333.33, 333.33, 333.34] or corte.loc[('P1', pd.Timestamp('2026-03-31')), 'saldo_no_devengado'] != 0:
+        errores.append(f"redondeo de la última cuota {cuotas_p1}")
+    if corte.loc[('P2', pd.Timestamp('2026-01-20')), 'monto_devengado'] != 0:
+        errores.append("corte anterior al pago")
+    if errores:
+        print("   ❌ Devengamiento incorrecto: " + ", ".join(errores))
+        exit(1)
+    print("   ✅ Devengamiento al corte y redondeo de la última cuota correctos")
+except Exception as e:
+    print(f"   ❌ Error en devengamiento: {e}")
+    import traceback
+    traceback.print_exc()
+    exit(1)
+
+# Test 9: Valuación de inversiones (join as-of de precios y devengamiento)
+print("\n9. Valuando inversiones de prueba...")
+try:
+    from valuacion_inversiones import precios_asof, valuar_inversiones
+
+    precios = pd.DataFrame({
+        'id_inversion': ['F1', 'F1', 'F1'],
+        'fecha': ['2026-01-05', '2026-01-10', '2026-01-20'],
+        'precio': [100.0, 110.0, 120.0]
+    })
+    # Antes del primer precio, fecha exacta, entre precios e id desconocido
+    asof = precios_asof(precios, ['F1', 'F1', 'F1', 'X'], ['2026-01-01', '2026-01-10', '2026-01-15', '2026-01-15'])
+    if not (np.isnan(asof[0]) and asof[1] == 110 and asof[2] == 110 and np.isnan(asof[3])):
+        print(f"   ❌ Join as-of incorrecto: {asof}")
+        exit(1)
+
+    inversiones = pd.DataFrame({
+        'id_inversion': ['PF1', 'F1'],
+        'tipo': ['Plazo Fijo', 'FCI'],
+        'monto_inicial': [1000.0, 1000.0],
+        'tasa_anual': [0.365, 0.0],
+        'fecha_inicio': ['2026-01-01', '2026-01-05'],
+        'valor_actual': [1200.0, 1200.0],
+        'estado': ['Activa', 'Activa']
+    })
+    # PF1: 1000 x (1 + 0.365 x 20 / 365) = 1020 -> desvío 17.6% > 5%; F1: 1000 x 120 / 100 = 1200
+    valuacion = valuar_inversiones(inversiones, precios, '2026-01-21').set_index('id_inversion')
+    if (valuacion.loc['PF1', 'valor_esperado'] != 1020 or valuacion.loc['PF1', 'alerta_valuacion'] != 'Desvío de valuación'
+            or valuacion.loc['F1', 'valor_esperado'] != 1200 or valuacion.loc['F1', 'alerta_valuacion'] is not None):
+        print("   ❌ Valuación incorrecta:\n" + valuacion[['valor_esperado', 'alerta_valuacion']].to_string())
+        exit(1)
+
+    # Cartera sólo de plazos fijos: no hay tabla de precios
+    sin_precios = precios.iloc[0:0]
+    if not np.isnan(precios_asof(sin_precios, ['F1'], ['2026-01-10'])).all():
+        print("   ❌ Join as-of sin precios incorrecto")
+        exit(1)
+    valuacion = valuar_inversiones(inversiones.iloc[:1], sin_precios, '2026-01-21')
+    if valuacion['valor_esperado'].tolist() != [1020]:
+        print(f"   ❌ Valuación sin precios incorrecta: {valuacion['valor_esperado'].tolist()}")
+        exit(1)
+    print("   ✅ Precios as-of, devengamiento y alerta de desvío correctos")
+except Exception as e:
+    print(f"   ❌ Error en valuación de inversiones: {e}")
+    import traceback
+    traceback.print_exc()
+    exit(1)
+
+# Test 10: Conciliación de cobranzas y pagos contra Caja y Bancos
+print("\n10. Conciliando rubros contra Caja y Bancos...")
+try:
+    from conciliacion_rubros import conciliar_rubros, partidas_sin_conciliar
+
+    caja = pd.DataFrame({
+        'fecha_hora': ['2026-02-10 10:00:00', '2026-02-11 10:00:00', '2026-06-30 10:00:00',
+                       '2026-02-12 10:00:00', '2026-03-01 09:30:00', '2026-03-02 12:00:00'],
+        'tipo_transaccion': ['Cobranza', 'Cobranza', 'Cobranza', 'Venta', 'Pago', 'Pago'],
+        'contraparte': ['ACME SA', 'acme sa ', 'Beta SRL', 'Gamma SA', 'Proveedor Uno', 'Proveedor Dos'],
+        'monto': [500.0, 500.0, 800.0, 300.0, 1000.0, 2000.0]
+    })
+    cuentas = pd.DataFrame({
+        'factura_id': ['C1', 'C2', 'C3', 'C4', 'C5', 'C6'],
+        'cliente': ['ACME SA', 'ACME SA', 'ACME SA', 'Beta SRL', 'Delta SA', 'Gamma SA'],
+        'fecha_emision': ['2026-01-01'] * 6,
+        'fecha_vencimiento': ['2026-01-31'] * 6,
+        'monto_cobrado': [500.0, 500.0, 500.0, 800.0, 300.0, 0.0]
+    })
+    prepagos = pd.DataFrame({
+        'id_prepago': ['P1', 'P2', 'P3'],
+        'proveedor': ['Proveedor Uno', 'Proveedor Dos', 'Proveedor Tres'],
+        'fecha_pago': ['2026-03-01', '2026-03-01', '2026-03-01'],
+        'monto_total': [1000.0, 2000.0, 1000.0]
+    })
+    # C1/C2: dos ingresos iguales de ACME; C3: tercer cobro duplicado sin ingreso;
+    # C4: ingreso fuera de la ventana; C5: importe correcto pero otro cliente; C6: sin cobranza.
+    # P2: pago en otra fecha; P3: importe de P1 pero otro proveedor
+    data = conciliar_rubros({'Caja y Bancos': caja, 'Cuentas a Cobrar': cuentas, 'Prepagos': prepagos})
+    cobranzas = data['Cuentas a Cobrar']['conciliado_caja'].tolist()
+    pagos = data['Prepagos']['conciliado_caja'].tolist()
+    if (cobranzas[:5] != [True, True, False, False, False] or not pd.isna(cobranzas[5])
+            or pagos != [True, False, False]):
+        print(f"   ❌ Conciliación incorrecta: {cobranzas} / {pagos}")
+        exit(1)
+    if partidas_sin_conciliar(data['Cuentas a Cobrar']) != 3 or partidas_sin_conciliar(data['Prepagos']) != 2:
+        print("   ❌ Conteo de partidas sin conciliar incorrecto")
+        exit(1)
+
+    # Muchas cuotas iguales de un mismo cliente: la factura que vence antes toma
+    # cada ingreso, así que ambas concilian aunque sus ventanas se superpongan
+    from conciliacion_rubros import conciliar_cobranzas
+    import time
+    n = 20_000
+    dias = np.arange(n) % 365
+    cuotas = pd.DataFrame({
+        'cliente': 'ACME SA', 'monto_cobrado': 100.0,
+        'fecha_emision': pd.Timestamp('2026-01-01') + pd.to_timedelta(dias, 'D'),
+        'fecha_vencimiento': pd.Timestamp('2026-01-01') + pd.to_timedelta(dias + np.where(np.arange(n) % 2, 2, 60), 'D')
+    })
+    ingresos = pd.DataFrame({
+        'tipo_transaccion': 'Cobranza', 'contraparte': 'ACME SA', 'monto': 100.0,
+        'fecha_hora': pd.Timestamp('2026-01-02') + pd.to_timedelta(dias[:n - 500], 'D')
+    })
+    inicio = time.time()
+    conciliadas = int(conciliar_cobranzas(cuotas, ingresos).sum())
+    if conciliadas != n - 500 or time.time() - inicio > 10:
+        print(f"   ❌ Cuotas repetidas: {conciliadas} conciliadas en {time.time() - inicio:.1f} s")
+        exit(1)
+    print("   ✅ Conciliación por contraparte, ventana de cobro y fecha de pago correcta")
+except Exception as e:
+    print(f"   ❌ Error en conciliación de rubros: {e}")
+    import traceback
+    traceback.print_exc()
+    exit(1)
+
+# Test 11: Agregados por período de Caja y Bancos
+print("\n11. Agregando movimientos de caja por período...")
+try:
+    from analitica_comparativa import AlmacenAgregados, agregar_por_periodo
+
+    caja = pd.DataFrame({
+        'fecha_hora': ['2026-01-05 10:00:00', '2026-01-20 10:00:00', '2026-02-03 10:00:00', '2026-02-04 10:00:00'],
+        'tipo_transaccion': ['Venta', 'Gasto', 'Cobranza', 'Pago'],
+        'monto': [1000.0, 400.0, 300.0, 500.0]
+    })
+    agregados = agregar_por_periodo(caja, 'fecha_hora', 'monto')
+    if agregados['importe'].tolist() != [600.0, -200.0]:
+        print(f"   ❌ Flujo neto incorrecto: {agregados['importe'].tolist()}")
+        exit(1)
+
+    # Con datos diarios hasta agosto de 2025, ese año está incompleto: no se compara
+    from analitica_comparativa import variaciones
+    diarios = pd.DataFrame({'fecha': pd.date_range('2022-01-01', '2025-08-15', freq='D'), 'monto': 100.0})
+    anual = variaciones(agregar_por_periodo(diarios, 'fecha', 'monto', '2025-08-15'), 'Y')
+    if (anual['periodo_completo'].tolist() != [True, True, True, False]
+            or anual['fluctuacion'].notna().any() or not np.isnan(anual.loc['2025', 'variacion_pct'])):
+        print("   ❌ Período incompleto comparado:\n" + anual[['importe', 'variacion_pct', 'fluctuacion']].to_string())
+        exit(1)
+
+    # Un directorio inutilizable no interrumpe la auditoría
+    with tempfile.NamedTemporaryFile() as archivo:
+        AlmacenAgregados(os.path.join(archivo.name, 'agregados')).actualizar('EMPRESA', 'Caja y Bancos', agregados)
+    print("   ✅ Flujo neto, períodos incompletos excluidos y el disco es un respaldo")
+except Exception as e:
+    print(f"   ❌ Error en agregados por período: {e}")
+    import traceback
+    traceback.print_exc()
+    exit(1)
+
+# Test 12: Poda de modelos en la caché persistente
+print("\n12. Podando modelos de la caché persistente...")
+try:
+    import cache_persistente
+
+    directorio_original, maximo_original = cache_persistente.DIRECTORIO_MODELOS, cache_persistente.MAX_MODELOS_DISCO
+    cache_persistente.DIRECTORIO_MODELOS = tempfile.mkdtemp()
+    cache_persistente.MAX_MODELOS_DISCO = 2
+    try:
+        for semilla in range(3):
+            X = pd.DataFrame(np.random.default_rng(semilla).normal(size=(50, 2)), columns=['a', 'b'])
+            cache_persistente.modelo_ajustado(X)
+        modelos = [n for n in os.listdir(cache_persistente.DIRECTORIO_MODELOS) if n.startswith('isolation_forest_')]
+    finally:
+        cache_persistente.DIRECTORIO_MODELOS = directorio_original
+        cache_persistente.MAX_MODELOS_DISCO = maximo_original
+    if len(modelos) != 2:
+        print(f"   ❌ Se esperaban 2 modelos en disco y hay {len(modelos)}")
+        exit(1)
+    print("   ✅ Sólo se conservan los modelos usados más recientemente")
+except Exception as e:
+    print(f"   ❌ Error en la poda de modelos: {e}")
+    import traceback
+    traceback.print_exc()
+    exit(1)
+
+# Test 13: Exportación de papeles de trabajo a XLSX
+print("\n13. Exportando papeles de trabajo a XLSX...")
+try:
+    from openpyxl import load_workbook
+    from exportacion_papeles import exportar_xlsx
+
+    papeles = {
+        'Inventarios': pd.DataFrame({'id_item': [f'I{i}' for i in range(5)],
+                                     'dias_stock': [10.0, np.inf, -np.inf, np.nan, 3.5]}),
+        'Caja y Bancos': pd.DataFrame({'id_transaccion': [1, 2], 'monto': [100.0, 200.0]})
+    }
+    with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as tmp:
+        ruta_xlsx = tmp.name
+    exportar_xlsx(papeles, ruta_xlsx, filas_por_bloque=2, max_filas_hoja=2)
+    libro = load_workbook(ruta_xlsx)
+    hojas = {nombre: list(libro[nombre].iter_rows(values_only=True)) for nombre in libro.sheetnames}
+    libro.close()
+    os.unlink(ruta_xlsx)
+
+    esperadas = ['Inventarios', 'Inventarios (2)', 'Inventarios (3)', 'Caja y Bancos']
+    if list(hojas) != esperadas or [len(filas) - 1 for filas in hojas.values()] != [2, 2, 1, 2]:
+        print(f"   ❌ Hojas incorrectas: {[(n, len(f)) for n, f in hojas.items()]}")
+        exit(1)
+    if any(filas[0] != ('id_item', 'dias_stock') for nombre, filas in hojas.items() if nombre.startswith('Inventarios')):
+        print("   ❌ Falta el encabezado en las hojas de continuación")
+        exit(1)
+    dias_stock = [fila[1] for nombre in esperadas[:3] for fila in hojas[nombre][1:]]
+    if dias_stock != [10.0, None, None, None, 3.5]:
+        print(f"   ❌ Infinitos o NaN mal exportados: {dias_stock}")
+        exit(1)
+    print("   ✅ Hojas partidas por límite de filas e infinitos exportados como celdas vacías")
+except Exception as e:
+    print(f"   ❌ Error en exportación XLSX: {e}")
+    import traceback
+    traceback.print_exc()
+    exit(1)
+
+# Test 14: Auditoría por bloques con presupuesto de memoria acotado
+print("\n14. Auditando por bloques con presupuesto de memoria acotado...")
+try:
+    import pyarrow.parquet as pq
+    import auditoria_activos_corrientes as app
+    from ejecucion_fuera_de_memoria import auditar_por_bloques, excede_presupuesto, leer_resultado
+    from visor_hallazgos import materialidad_hallazgos
+
+    rng = np.random.default_rng(0)
+    n = 25_000  # con 1 MB de presupuesto: 3 bloques de 10.000 filas
+    caja = pd.DataFrame({
+        'id_transaccion': np.arange(n),
+        'monto': rng.lognormal(8, 1, n).round(2),
+        'saldo_acumulado': rng.normal(50_000, 20_000, n).round(2)
+    })
+    features = app.FEATURES_IF['Caja y Bancos']
+    if not excede_presupuesto(n, len(features), 1):
+        print("   ❌ El presupuesto de prueba no fuerza la ejecución por bloques")
+        exit(1)
+
+    # Rama fuera de memoria de la auditoría en la aplicación
+    en_app = app.auditoria_isolation_forest(caja.copy(), features, presupuesto_mb=1)
+    anomalas_app = int((en_app['resultado_if'] == 'Anómalo').sum())
+    if len(en_app) != n or not 0.05 * n <= anomalas_app <= 0.15 * n or en_app['factor_principal'].isna().sum() != n - anomalas_app:
+        print(f"   ❌ Rama fuera de memoria incorrecta: {anomalas_app} anomalías")
+        exit(1)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        destino = os.path.join(directorio, 'caja.parquet')
+        resumen = auditar_por_bloques(caja, features, destino,
+                                      reglas=lambda bloque: app.aplicar_reglas_negocio(bloque, 'Caja y Bancos'),
+                                      columna_importe='monto', presupuesto_mb=1, hallazgos_retenidos=10)
+        esquema = pq.read_schema(destino)
+        volcado = pd.concat(leer_resultado(destino), ignore_index=True)
+
+    esperadas = {'id_transaccion', 'monto', 'saldo_acumulado', 'anomaly_if', 'resultado_if', 'score_if',
+                 'contrib_monto', 'contrib_saldo_acumulado', 'factor_principal', 'alerta'}
+    if (resumen['cantidad'] != n or len(volcado) != n or not esperadas <= set(esquema.names)
+            or resumen['anomalias'] != int((volcado['resultado_if'] == 'Anómalo').sum())
+            or resumen['con_alerta'] != int(volcado['alerta'].notna().sum())
+            or abs(resumen['importe'] - round(caja['monto'].sum(), 2)) > 0.01):
+        print(f"   ❌ Resumen o Parquet incorrectos: {resumen['cantidad']} filas, {esquema.names}")
+        exit(1)
+
+    # Los hallazgos retenidos son las 10 anomalías de mayor materialidad de todo el rubro
+    anomalas = volcado[volcado['resultado_if'] == 'Anómalo']
+    esperados = anomalas.iloc[np.argsort(-materialidad_hallazgos(anomalas, 'monto'))[:10]]
+    if (len(resumen['hallazgos']) != 10
+            or sorted(resumen['hallazgos']['id_transaccion']) != sorted(esperados['id_transaccion'])):
+        print("   ❌ Hallazgos retenidos incorrectos")
+        exit(1)
+    print(f"   ✅ {n} filas en bloques, {resumen['anomalias']} anomalías y 10 hallazgos retenidos")
+except Exception as e:
+    print(f"   ❌ Error en la auditoría por bloques: {e}")
+    import traceback
+    traceback.print_exc()
+    exit(1)
+
 print("\n" + "=" * 60)
 print("✅ TODOS LOS TESTS PASARON CORRECTAMENTE")
 print("=" * 60)
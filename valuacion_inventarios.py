@@ -0,0 +1,159 @@
+"""
+MOTOR DE VALUACIÓN DE INVENTARIOS - RT 31 / RT 17
+Valúa historiales de movimientos por id_item mediante capas de costo FIFO y
+precio promedio ponderado (PPP), y calcula rotación, días de stock y
+clasificación de baja rotación u obsolescencia.
+
+Todas las operaciones son agrupadas sobre arrays (factorize + bincount +
+sumas acumuladas por grupo), sin bucles por ítem ni por movimiento.
+"""
+
+import numpy as np
+import pandas as pd
+
+DIAS_BAJA_ROTACION = 180
+DIAS_OBSOLESCENCIA = 365
+
+
+def _codificar_movimientos(movimientos, fecha_corte):
+    """Convierte los movimientos en arrays ordenados por (ítem, fecha)"""
+    codigos, items = pd.factorize(movimientos['id_item'], sort=True)
+    fechas = pd.to_datetime(movimientos['fecha']).to_numpy('datetime64[D]').astype(np.int64)
+    es_entrada = (movimientos['tipo'] == 'Entrada').to_numpy()
+    cantidad = movimientos['cantidad'].to_numpy(dtype=np.float64)
+    costo = movimientos['costo_unitario'].fillna(0).to_numpy(dtype=np.float64)
+
+    corte = np.datetime64(pd.Timestamp(fecha_corte).date(), 'D').astype(np.int64)
+    vigentes = fechas <= corte
+    orden = np.lexsort((fechas, codigos))
+    orden = orden[vigentes[orden]]
+
+    return {
+        'items': np.asarray(items),
+        'codigos': codigos[orden],
+        'fechas': fechas[orden],
+        'es_entrada': es_entrada[orden],
+        'cantidad': cantidad[orden],
+        'costo': costo[orden],
+        'corte': corte
+    }
+
+
+def _cumsum_por_grupo(valores, codigos):
+    """Suma acumulada que se reinicia en cada grupo (codigos ordenados)"""
+    acumulado = np.cumsum(valores)
+    inicio = np.r_[True, codigos[1:] != codigos[:-1]]
+    indice_inicio = np.maximum.accumulate(np.where(inicio, np.arange(len(valores)), 0))
+    return acumulado - (acumulado - valores)[indice_inicio]
+
+
+def _capas_fifo(datos, existencia):
+    """Calcula la cantidad que sobrevive de cada entrada bajo FIFO"""
+    entradas = np.flatnonzero(datos['es_entrada'])
+    codigos = datos['codigos'][entradas]
+    # Las capas que quedan en stock son las más recientes: se recorren de atrás hacia adelante
+    inverso = np.lexsort((-datos['fechas'][entradas], codigos))
+    entradas = entradas[inverso]
+    codigos = codigos[inverso]
+
+    cantidad = datos['cantidad'][entradas]
+    previo = _cumsum_por_grupo(cantidad, codigos) - cantidad
+    remanente = np.clip(existencia[codigos] - previo, 0, cantidad)
+    return entradas, codigos, remanente
+
+
+def capas_fifo(movimientos, fecha_corte=None):
+    """Devuelve las capas de costo FIFO que componen la existencia final"""
+    fecha_corte = pd.Timestamp.today().normalize() if fecha_corte is None else fecha_corte
+    datos = _codificar_movimientos(movimientos, fecha_corte)
+    n_items = len(datos['items'])
+    signo = np.where(datos['es_entrada'], 1.0, -1.0)
+    existencia = np.bincount(datos['codigos'], signo * datos['cantidad'], minlength=n_items)
+
+    entradas, codigos, remanente = _capas_fifo(datos, existencia)
+    conservar = remanente > 0
+    return pd.DataFrame({
+        'id_item': datos['items'][codigos[conservar]],
+        'fecha_ingreso': datos['fechas'][entradas[conservar]].astype('datetime64[D]'),
+        'cantidad': remanente[conservar],
+        'costo_unitario': datos['costo'][entradas[conservar]],
+        'valor': remanente[conservar] * datos['costo'][entradas[conservar]]
+    })
+
+
+def valuar_inventario(movimientos, fecha_corte=None,
+                      dias_baja_rotacion=DIAS_BAJA_ROTACION,
+                      dias_obsolescencia=DIAS_OBSOLESCENCIA):
+    """
+    Valúa el inventario a la fecha de corte a partir de sus movimientos.
+
+    movimientos: DataFrame con id_item, fecha, tipo ('Entrada'/'Salida'),
+    cantidad (positiva) y costo_unitario (en las entradas).
+    Devuelve un DataFrame con una fila por id_item.
+    """
+    fecha_corte = pd.Timestamp.today().normalize() if fecha_corte is None else fecha_corte
+    datos = _codificar_movimientos(movimientos, fecha_corte)
+    codigos = datos['codigos']
+    fechas = datos['fechas']
+    es_entrada = datos['es_entrada']
+    cantidad = datos['cantidad']
+    n_items = len(datos['items'])
+
+    cant_entrada = np.where(es_entrada, cantidad, 0.0)
+    cant_salida = np.where(es_entrada, 0.0, cantidad)
+    entradas_q = np.bincount(codigos, cant_entrada, minlength=n_items)
+    entradas_val = np.bincount(codigos, cant_entrada * datos['costo'], minlength=n_items)
+    salidas_q = np.bincount(codigos, cant_salida, minlength=n_items)
+    existencia = entradas_q - salidas_q
+
+    # Precio promedio ponderado
+    with np.errstate(divide='ignore', invalid='ignore'):
+        costo_ppp = np.where(entradas_q > 0, entradas_val / entradas_q, 0.0)
+    valor_ppp = np.maximum(existencia, 0) * costo_ppp
+
+    # FIFO: la existencia se compone de las capas de ingreso más recientes
+    entradas, cod_entradas, remanente = _capas_fifo(datos, existencia)
+    valor_fifo = np.bincount(cod_entradas, remanente * datos['costo'][entradas], minlength=n_items)
+    costo_ventas_fifo = entradas_val - valor_fifo
+
+    # Stock promedio ponderado en el tiempo: stock tras cada movimiento por los días que permanece
+    stock = _cumsum_por_grupo(cant_entrada - cant_salida, codigos)
+    ultimo = np.r_[codigos[1:] != codigos[:-1], True]
+    siguiente = np.where(ultimo, datos['corte'], np.r_[fechas[1:], datos['corte']])
+    dias_vigencia = np.maximum(siguiente - fechas, 0)
+    stock_dias = np.bincount(codigos, np.maximum(stock, 0) * dias_vigencia, minlength=n_items)
+
+    primera_fecha = np.full(n_items, datos['corte'], dtype=np.int64)
+    np.minimum.at(primera_fecha, codigos, fechas)
+    dias_periodo = np.maximum(datos['corte'] - primera_fecha, 1)
+    stock_promedio = stock_dias / dias_periodo
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rotacion = np.where(stock_promedio > 0, salidas_q / stock_promedio * 365 / dias_periodo, 0.0)
+        dias_stock = np.where(rotacion > 0, 365 / rotacion, np.inf)
+
+    ultima_salida = np.full(n_items, np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(ultima_salida, codigos[~es_entrada], fechas[~es_entrada])
+    referencia = np.where(ultima_salida == np.iinfo(np.int64).min, primera_fecha, ultima_salida)
+    dias_sin_salida = datos['corte'] - referencia
+
+    clasificacion = np.select(
+        [existencia < 0,
+         (existencia > 0) & (dias_sin_salida >= dias_obsolescencia),
+         (existencia > 0) & (dias_stock > dias_baja_rotacion)],
+        ['Stock negativo', 'Obsoleto', 'Baja rotación'],
+        default=None
+    )
+
+    return pd.DataFrame({
+        'id_item': datos['items'],
+        'existencia': np.round(existencia, 2),
+        'costo_ppp': np.round(costo_ppp, 2),
+        'valor_ppp': np.round(valor_ppp, 2),
+        'valor_fifo': np.round(valor_fifo, 2),
+        'costo_ventas_fifo': np.round(costo_ventas_fifo, 2),
+        'rotacion': np.round(rotacion, 2),
+        'dias_stock': np.round(dias_stock, 1),
+        'dias_sin_salida': dias_sin_salida,
+        'clasificacion_rotacion': clasificacion
+    })
@@ -0,0 +1,101 @@
+"""
+MOTOR DE VALUACIÓN DE INVERSIONES TEMPORARIAS
+Recalcula el valor esperado de cada posición a la fecha de valuación:
+- Plazo Fijo y Cauciones: devengamiento de intereses (capitalización simple, base 365)
+- FCI, Acciones y Bonos: valor a mercado según tabla de precios (join as-of ordenado)
+
+Compara el valor esperado con valor_actual y señala los desvíos. Todo el
+cálculo se hace sobre arrays completos.
+"""
+
+import numpy as np
+import pandas as pd
+
+TIPOS_DEVENGAMIENTO = ('Plazo Fijo', 'Cauciones')
+TIPOS_MERCADO = ('FCI', 'Acciones', 'Bonos')
+TOLERANCIA_DESVIO = 0.05
+
+
+def _dias(fechas):
+    return pd.to_datetime(fechas).to_numpy('datetime64[D]').astype(np.int64)
+
+
+def precios_asof(precios, ids, fechas):
+    """
+    Devuelve, para cada (id, fecha), el último precio publicado en o antes de esa fecha.
+
+    precios: DataFrame con id_inversion, fecha y precio. Devuelve NaN si no hay precio previo.
+    """
+    ids = np.asarray(ids)
+    if precios.empty:
+        return np.full(len(ids), np.nan)
+    fechas = _dias(fechas)
+    codigos, catalogo = pd.factorize(np.concatenate([precios['id_inversion'].to_numpy(), ids]))
+    cod_precios = codigos[:len(precios)].astype(np.int64)
+    cod_consulta = codigos[len(precios):].astype(np.int64)
+
+    # Clave compuesta (id, fecha) ordenable como un único entero
+    desplazamiento = np.int64(1 << 32)
+    base = np.int64(1 << 31)
+    clave_precios = cod_precios * desplazamiento + _dias(precios['fecha']) + base
+    clave_consulta = cod_consulta * desplazamiento + fechas + base
+
+    orden = np.argsort(clave_precios, kind='stable')
+    clave_precios = clave_precios[orden]
+    valores = precios['precio'].to_numpy(dtype=np.float64)[orden]
+
+    posicion = np.searchsorted(clave_precios, clave_consulta, side='right') - 1
+    valida = posicion >= 0
+    posicion = np.maximum(posicion, 0)
+    valida &= (clave_precios[posicion] // desplazamiento) == cod_consulta
+    return np.where(valida, valores[posicion], np.nan)
+
+
+def valuar_inversiones(df, precios, fecha_valuacion, tolerancia=TOLERANCIA_DESVIO):
+    """Agrega valor esperado, desvío y alerta de valuación a cada inversión"""
+    df = df.copy(deep=False)
+    tipo = df['tipo'].to_numpy()
+    monto_inicial = df['monto_inicial'].to_numpy(dtype=np.float64)
+    tasa_anual = df['tasa_anual'].to_numpy(dtype=np.float64)
+    corte = pd.Timestamp(fecha_valuacion).normalize()
+
+    dias = (corte.to_datetime64().astype('datetime64[D]').astype(np.int64)
+            - _dias(df['fecha_inicio']))
+    posterior_al_corte = dias < 0
+    dias = np.maximum(dias, 0)
+
+    es_devengamiento = np.isin(tipo, TIPOS_DEVENGAMIENTO)
+    es_mercado = np.isin(tipo, TIPOS_MERCADO)
+
+    valor_devengado = monto_inicial * (1 + tasa_anual * dias / 365)
+
+    ids = df['id_inversion'].to_numpy()
+    precio_inicio = precios_asof(precios, ids, df['fecha_inicio'])
+    precio_corte = precios_asof(precios, ids, np.full(len(df), corte))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        valor_mercado = monto_inicial * precio_corte / precio_inicio
+
+    activa = (df['estado'] == 'Activa').to_numpy() if 'estado' in df.columns else np.ones(len(df), bool)
+    valor_esperado = np.select([es_devengamiento, es_mercado], [valor_devengado, valor_mercado], np.nan)
+    valor_esperado = np.where(activa, valor_esperado, np.nan)
+
+    valor_actual = df['valor_actual'].to_numpy(dtype=np.float64)
+    desvio = valor_actual - valor_esperado
+    with np.errstate(divide='ignore', invalid='ignore'):
+        desvio_pct = desvio / valor_esperado
+
+    sin_precio = activa & es_mercado & np.isnan(valor_mercado)
+    df['dias_tenencia'] = dias
+    df['valor_esperado'] = np.round(valor_esperado, 2)
+    df['desvio_valuacion'] = np.round(desvio, 2)
+    df['desvio_pct'] = np.round(desvio_pct, 4)
+    df['alerta_valuacion'] = np.select(
+        [activa & posterior_al_corte,
+         sin_precio,
+         np.abs(np.nan_to_num(desvio_pct)) > tolerancia],
+        ['Inicio posterior a la fecha de valuación',
+         'Sin precio de mercado',
+         'Desvío de valuación'],
+        default=None
+    )
+    return df
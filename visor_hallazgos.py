@@ -0,0 +1,80 @@
+"""
+VISOR PAGINADO DE HALLAZGOS
+Ordena los hallazgos de un rubro por materialidad (score de anomalía por
+importe) y devuelve únicamente la página visible. La selección usa top-k con
+argpartition, de modo que el costo de servir una página no depende de ordenar
+todo el rubro y el volumen enviado al navegador es constante.
+"""
+
+import numpy as np
+import pandas as pd
+
+TAMANO_PAGINA = 25
+FILTRO_TODAS = 'Todas'
+FILTRO_SIN_ALERTA = 'Sin alerta'
+
+
+def materialidad_hallazgos(df, columna_importe):
+    """Materialidad = score de anomalía x |importe|"""
+    score = df['score_if'].to_numpy(dtype=np.float64) if 'score_if' in df.columns else np.ones(len(df))
+    importe = np.abs(np.nan_to_num(df[columna_importe].to_numpy(dtype=np.float64)))
+    return score * importe
+
+
+def top_k(valores, k, descendente=True):
+    """Posiciones de los k mayores (o menores) valores, ordenadas"""
+    valores = np.asarray(valores, dtype=np.float64)
+    clave = -valores if descendente else valores
+    clave = np.where(np.isnan(clave), np.inf, clave)
+    k = min(k, len(clave))
+    if k == 0:
+        return np.array([], dtype=np.int64)
+    if k < len(clave):
+        candidatos = np.argpartition(clave, k - 1)[:k]
+    else:
+        candidatos = np.arange(len(clave))
+    return candidatos[np.argsort(clave[candidatos], kind='stable')]
+
+
+def opciones_alerta(df):
+    """Valores de alerta presentes entre los hallazgos, para el filtro"""
+    anomalos = df['resultado_if'] == 'Anómalo'
+    alertas = df.loc[anomalos, 'alerta'].dropna().unique().tolist() if 'alerta' in df.columns else []
+    return [FILTRO_TODAS, FILTRO_SIN_ALERTA] + sorted(alertas)
+
+
+def _mascara_hallazgos(df, alerta):
+    mascara = (df['resultado_if'] == 'Anómalo').to_numpy()
+    if alerta == FILTRO_SIN_ALERTA:
+        mascara &= df['alerta'].isna().to_numpy()
+    elif alerta != FILTRO_TODAS:
+        mascara &= (df['alerta'] == alerta).to_numpy()
+    return mascara
+
+
+def contar_hallazgos(df, alerta=FILTRO_TODAS):
+    """Cantidad de hallazgos que pasan el filtro de alerta"""
+    return int(_mascara_hallazgos(df, alerta).sum())
+
+
+def pagina_hallazgos(df, columna_importe, pagina=0, tamano_pagina=TAMANO_PAGINA,
+                     alerta=FILTRO_TODAS, orden='materialidad', descendente=True):
+    """
+    Devuelve (página, total) con los hallazgos filtrados por alerta y ordenados.
+
+    Sólo se materializan las filas de la página solicitada.
+    """
+    posiciones = np.flatnonzero(_mascara_hallazgos(df, alerta))
+    total = len(posiciones)
+
+    if orden == 'materialidad':
+        valores = materialidad_hallazgos(df, columna_importe)[posiciones]
+    else:
+        valores = pd.to_numeric(df[orden], errors='coerce').to_numpy(dtype=np.float64)[posiciones]
+
+    inicio = pagina * tamano_pagina
+    seleccion = top_k(valores, inicio + tamano_pagina, descendente)[inicio:]
+
+    resultado = df.iloc[posiciones[seleccion]].copy()
+    resultado.insert(0, 'materialidad', np.round(materialidad_hallazgos(resultado, columna_importe), 2))
+    return resultado, total